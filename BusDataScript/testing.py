@@ -8,8 +8,12 @@ import re
 import json  
 import os  
 import shutil  
+import time
+import random
+import argparse
+import requests.adapters
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from urllib.request import urlopen
 
 bus_ids = [ 2901,2914,2922,2938,3009,3010,3016,3018,3019,3021,3023,3031,3032,3033,3034,3038,3042,3045,3102,3104,
             3108,3112,3113,3117,3123,3124,3125,3127,3130,3134,3139,3140,3143,3145,3153,3157,3160,3163,3202,3203,
@@ -22,41 +26,105 @@ bus_ids = [ 2901,2914,2922,2938,3009,3010,3016,3018,3019,3021,3023,3031,3032,303
             4014,4017,4019,4026,4031,4034,4035,4037,4038,4039,4041,4042,4049,4051,4057,4058,4060,4062,4064,4071,
             4201,4202,4204,4207,4216,4218,4227,4231,4234,4235,4237,4302,4513,4516,4519,4520,4521,4531,99222]
 
-today = datetime.today()
-date_str = today.strftime("%Y%m%d")
-output_dir = date_str
-if os.path.exists(output_dir):
-    shutil.rmtree(output_dir) 
-os.makedirs(output_dir, exist_ok=True)
+BASE_URL = "https://busdata.cs.pdx.edu/api/getBreadCrumbs"
+CONCURRENCY = 16   # requests in flight at once
+TIMEOUT = 30       # seconds per request
+RETRIES = 4        # extra attempts after the first one fails
+BACKOFF = 0.5      # base delay in seconds, doubled on every retry
 
-count = 0
-for bus_id in bus_ids:
-    url = f"https://busdata.cs.pdx.edu/api/getBreadCrumbs?vehicle_id={bus_id}"
-    try:
-        response = urlopen(url)
-        if response.getcode() != 200:
-            error_message = f"Error: Received status code {response.getcode()} for bus {bus_id}"
-            print(error_message)
-            error_folder = f"{date_str}_Error"
-            os.makedirs(error_folder, exist_ok=True)
-            error_file_path = os.path.join(error_folder, f"BUS{bus_id}_{date_str}_error.txt")
-            with open(error_file_path, 'w') as ef:
-                ef.write(error_message)
-            continue
-        content = response.read().decode('utf-8').strip()
-        file_path = os.path.join(output_dir, f"BUS{bus_id}_{date_str}.json")
-        with open(file_path, 'w') as f:
-            f.write(content)
-        count += 1
-    except Exception as e:
-        error_message = f"Error fetching data for bus {bus_id}: {e}"
-        print(error_message)
-        error_folder = f"{date_str}_Error"
-        os.makedirs(error_folder, exist_ok=True)
-        error_file_path = os.path.join(error_folder, f"BUS{bus_id}_{date_str}_error.txt")
-        with open(error_file_path, 'w') as ef:
-            ef.write(error_message)
-print(f"Total files saved: {count}")
+# Status codes worth retrying; anything else non-200 is recorded as an error straight away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def write_error(error_folder, bus_id, date_str, error_message):
+    print(error_message)
+    os.makedirs(error_folder, exist_ok=True)
+    error_file_path = os.path.join(error_folder, f"BUS{bus_id}_{date_str}_error.txt")
+    with open(error_file_path, 'w') as ef:
+        ef.write(error_message)
+
+# Fetch one vehicle's breadcrumbs over the shared session, retrying with
+# exponential backoff plus jitter. Returns (bus_id, content or None, error, latencies)
+def fetch_bus(session, bus_id, base_url=BASE_URL, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    url = f"{base_url}?vehicle_id={bus_id}"
+    latencies = []
+    error_message = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=timeout)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 200:
+                return bus_id, response.content.decode('utf-8').strip(), None, latencies
+            error_message = f"Error: Received status code {response.status_code} for bus {bus_id}"
+            if response.status_code not in RETRY_STATUS:
+                break
+        except requests.RequestException as e:
+            latencies.append(time.perf_counter() - start)
+            error_message = f"Error fetching data for bus {bus_id}: {e}"
+        except Exception as e:
+            # e.g. a body that is not UTF-8; retrying will not help
+            error_message = f"Error fetching data for bus {bus_id}: {e}"
+            break
+    return bus_id, None, error_message, latencies
+
+# Fetch every bus concurrently and write BUS{id}_{date}.json files (or error
+# files in the {date}_Error folder) as the responses come back
+def fetch_all(bus_ids, date_str, base_url=BASE_URL, concurrency=CONCURRENCY, timeout=TIMEOUT, retries=RETRIES):
+    output_dir = date_str
+    error_folder = f"{date_str}_Error"
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # One session pools and reuses keep-alive connections to the API host
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    count = 0
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(fetch_bus, session, bus_id, base_url, timeout, retries) for bus_id in bus_ids]
+        for future in as_completed(futures):
+            bus_id, content, error_message, bus_latencies = future.result()
+            latencies.extend(bus_latencies)
+            if content is None:
+                write_error(error_folder, bus_id, date_str, error_message)
+                continue
+            file_path = os.path.join(output_dir, f"BUS{bus_id}_{date_str}.json")
+            try:
+                with open(file_path, 'w') as f:
+                    f.write(content)
+            except Exception as e:
+                write_error(error_folder, bus_id, date_str, f"Error saving data for bus {bus_id}: {e}")
+                continue
+            count += 1
+    elapsed = time.perf_counter() - start
+    session.close()
+
+    print(f"Total files saved: {count}")
+    print(f"Fetched {len(bus_ids)} buses in {elapsed:.2f} seconds with {concurrency} concurrent requests")
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        print(f"Request latency (s): p50={p50:.3f} p90={p90:.3f} p99={p99:.3f} "
+              f"max={max(latencies):.3f} over {len(latencies)} requests")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download today's breadcrumbs for every bus")
+    parser.add_argument("--base-url", default=BASE_URL, help="breadcrumb endpoint, e.g. a local stub server")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    args = parser.parse_args()
+
+    today = datetime.today()
+    date_str = today.strftime("%Y%m%d")
+    fetch_all(bus_ids, date_str, args.base_url, args.concurrency, args.timeout, args.retries)
 
 """
 try:
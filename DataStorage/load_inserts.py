@@ -1,88 +1,160 @@
-# this program loads Census ACS data using basic, slow INSERTs 
-# run it with -h to see the command line options
+# this program loads Census ACS data into Postgres using one of several load strategies
+# run it with -h to see the command line options (use --benchmark to compare them)
 
 import time
 import psycopg2
+import psycopg2.extras
 import argparse
 import re
 import csv
+import json
+import os
+import sys
+import resource
+import hashlib
+import numpy as np
+import pandas as pd
+from io import StringIO, BytesIO
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
+DBhost = "localhost"
+DBport = 5432
 DBname = "postgres"
 DBuser = "postgres"
-DBpwd = "1Hammersmash!"
+DBpwd = os.environ.get("PGPASSWORD", "1Hammersmash!")
 TableName = 'CensusData'
 Datafile = "filedoesnotexist"  # name of the data file to be loaded
 CreateDB = False  # indicates whether the DB table should be (re)-created
+Strategy = "copy"  # which load path to use, see Strategies below
+ChunkSize = 65536  # number of characters handed to COPY per read when streaming
+BatchSize = 1000  # rows per multi-row INSERT for the values strategy
+RowLimit = None  # only load the first RowLimit rows of the data file
+SummaryFile = None  # append one JSON summary line per load to this file
+Benchmark = False  # run every strategy against a fresh table and compare
+CompareCopy = False  # limit the benchmark to the text and binary COPY strategies
+Workers = os.cpu_count() or 1  # number of connections/processes for the parallel strategy
+SetLogged = False  # convert the swapped-in table back to a WAL-logged table
+Manifest = None  # TractId -> row hash file used by the upsert strategy
+FrameRows = 100000  # rows per DataFrame chunk for the frames strategy
+Options = {}  # the parsed command line options, handed to worker processes
 
+# the CensusData columns in file/table order with their Postgres types;
+# createTable() and the cleaners below are all driven by this list
+Columns = [
+    ("TractId",             "NUMERIC"),
+    ("State",               "TEXT"),
+    ("County",              "TEXT"),
+    ("TotalPop",            "INTEGER"),
+    ("Men",                 "INTEGER"),
+    ("Women",               "INTEGER"),
+    ("Hispanic",            "DECIMAL"),
+    ("White",               "DECIMAL"),
+    ("Black",               "DECIMAL"),
+    ("Native",              "DECIMAL"),
+    ("Asian",               "DECIMAL"),
+    ("Pacific",             "DECIMAL"),
+    ("VotingAgeCitizen",    "DECIMAL"),
+    ("Income",              "DECIMAL"),
+    ("IncomeErr",           "DECIMAL"),
+    ("IncomePerCap",        "DECIMAL"),
+    ("IncomePerCapErr",     "DECIMAL"),
+    ("Poverty",             "DECIMAL"),
+    ("ChildPoverty",        "DECIMAL"),
+    ("Professional",        "DECIMAL"),
+    ("Service",             "DECIMAL"),
+    ("Office",              "DECIMAL"),
+    ("Construction",        "DECIMAL"),
+    ("Production",          "DECIMAL"),
+    ("Drive",               "DECIMAL"),
+    ("Carpool",             "DECIMAL"),
+    ("Transit",             "DECIMAL"),
+    ("Walk",                "DECIMAL"),
+    ("OtherTransp",         "DECIMAL"),
+    ("WorkAtHome",          "DECIMAL"),
+    ("MeanCommute",         "DECIMAL"),
+    ("Employed",            "INTEGER"),
+    ("PrivateWork",         "DECIMAL"),
+    ("PublicWork",          "DECIMAL"),
+    ("SelfEmployed",        "DECIMAL"),
+    ("FamilyWork",          "DECIMAL"),
+    ("Unemployment",        "DECIMAL"),
+]
+
+# render one row as the VALUES list of an INSERT, typed by Columns.
+# empty fields become NULL and text is quoted with embedded quotes doubled
 def row2vals(row):
-    for key in row:
-        if not row[key]:
-            row[key] = 0  # ENHANCE: handle the null vals
-        row['County'] = row['County'].replace('\'','')  # TIDY: eliminate quotes within literals
-
-    ret = f"""
-       {row['TractId']},                -- CensusTract
-       '{row['State']}',                -- State
-       '{row['County']}',               -- County
-       {row['TotalPop']},               -- TotalPop
-       {row['Men']},                    -- Men
-       {row['Women']},                  -- Women
-       {row['Hispanic']},               -- Hispanic
-       {row['White']},                  -- White
-       {row['Black']},                  -- Black
-       {row['Native']},                 -- Native
-       {row['Asian']},                  -- Asian
-       {row['Pacific']},                -- Pacific
-       {row['VotingAgeCitizen']},       -- Citizen
-       {row['Income']},                 -- Income
-       {row['IncomeErr']},              -- IncomeErr
-       {row['IncomePerCap']},           -- IncomePerCap
-       {row['IncomePerCapErr']},        -- IncomePerCapErr
-       {row['Poverty']},                -- Poverty
-       {row['ChildPoverty']},           -- ChildPoverty
-       {row['Professional']},           -- Professional
-       {row['Service']},                -- Service
-       {row['Office']},                 -- Office
-       {row['Construction']},           -- Construction
-       {row['Production']},             -- Production
-       {row['Drive']},                  -- Drive
-       {row['Carpool']},                -- Carpool
-       {row['Transit']},                -- Transit
-       {row['Walk']},                   -- Walk
-       {row['OtherTransp']},            -- OtherTransp
-       {row['WorkAtHome']},             -- WorkAtHome
-       {row['MeanCommute']},            -- MeanCommute
-       {row['Employed']},               -- Employed
-       {row['PrivateWork']},            -- PrivateWork
-       {row['PublicWork']},             -- PublicWork
-       {row['SelfEmployed']},           -- SelfEmployed
-       {row['FamilyWork']},             -- FamilyWork
-       {row['Unemployment']}            -- Unemployment
-    """
-
-    return ret
+    vals = []
+    for (name, sqltype), val in zip(Columns, row.values()):
+        if not val:
+            vals.append("NULL")
+        elif sqltype == "TEXT":
+            vals.append("'" + val.replace("'", "''") + "'")
+        else:
+            vals.append(val)
+    return ', '.join(vals)
 
 
 def initialize():
   parser = argparse.ArgumentParser()
   parser.add_argument("-d", "--datafile", required=True)
   parser.add_argument("-c", "--createtable", action="store_true")
+  parser.add_argument("-s", "--strategy", choices=list(Strategies), default="copy")
+  parser.add_argument("--chunksize", type=int, default=65536)
+  parser.add_argument("--batchsize", type=int, default=1000)
+  parser.add_argument("--framerows", type=int, default=FrameRows, help="rows per chunk for the frames strategy")
+  parser.add_argument("--limit", type=int, default=None, help="only load the first N rows")
+  parser.add_argument("--summary", default=None, help="append JSON summaries to this file")
+  parser.add_argument("--benchmark", action="store_true", help="time every strategy on a fresh table")
+  parser.add_argument("--compare-copy", action="store_true", help="benchmark only text vs binary COPY")
+  parser.add_argument("--workers", type=int, default=Workers, help="processes used by the parallel strategy")
+  parser.add_argument("--logged", action="store_true", help="make the swap strategy's table crash-safe")
+  parser.add_argument("--manifest", default=None, help="row hash manifest for the upsert strategy")
+  parser.add_argument("--host", default=DBhost)
+  parser.add_argument("--port", type=int, default=DBport)
+  parser.add_argument("--dbname", default=DBname)
+  parser.add_argument("--user", default=DBuser)
   args = parser.parse_args()
 
-  global Datafile
-  Datafile = args.datafile
-  global CreateDB
-  CreateDB = args.createtable
+  opts = vars(args)
+  configure(opts)
+  return opts
+
+# copy the command line options into the module settings; benchmark worker
+# processes call this too so they load with the same settings as the parent
+def configure(opts):
+  global Datafile, CreateDB, Strategy, ChunkSize, BatchSize, FrameRows, RowLimit, SummaryFile, Benchmark, CompareCopy
+  global DBhost, DBport, DBname, DBuser, Workers, SetLogged, Manifest, Options
+  Options = opts
+  Datafile = opts["datafile"]
+  CreateDB = opts["createtable"]
+  Strategy = opts["strategy"]
+  ChunkSize = opts["chunksize"]
+  BatchSize = opts["batchsize"]
+  FrameRows = opts["framerows"]
+  RowLimit = opts["limit"]
+  SummaryFile = opts["summary"]
+  Benchmark = opts["benchmark"]
+  CompareCopy = opts["compare_copy"]
+  DBhost = opts["host"]
+  DBport = opts["port"]
+  DBname = opts["dbname"]
+  DBuser = opts["user"]
+  Workers = opts["workers"]
+  SetLogged = opts["logged"]
+  Manifest = opts["manifest"] or f"{TableName}_manifest.json"
+
+# iterate over the rows of the input data file without keeping them
+def readrows(fname):
+    with open(fname, mode="r", newline="") as fil:
+        yield from islice(csv.DictReader(fil), RowLimit)
 
 # read the input data file into a list of row strings
 def readdata(fname):
     print(f"readdata: reading from File: {fname}")
-    with open(fname, mode="r") as fil:
-        dr = csv.DictReader(fil)
-        
-        rowlist = []
-        for row in dr:
-            rowlist.append(row)
+    rowlist = []
+    for row in readrows(fname):
+        rowlist.append(row)
 
     return rowlist
 
@@ -98,7 +170,8 @@ def getSQLcmnds(rowlist):
 # connect to the database
 def dbconnect():
     connection = psycopg2.connect(
-        host="localhost",
+        host=DBhost,
+        port=DBport,
         database=DBname,
         user=DBuser,
         password=DBpwd,
@@ -108,55 +181,20 @@ def dbconnect():
 
 # create the target table 
 # assumes that conn is a valid, open connection to a Postgres database
-def createTable(conn):
+def createTable(conn, table=TableName, unlogged=False):
+    columns = ',\n                '.join(f"{name:20}{sqltype}" for name, sqltype in Columns)
 
     with conn.cursor() as cursor:
         cursor.execute(f"""
-            DROP TABLE IF EXISTS {TableName};
-            CREATE TABLE {TableName} (
-                TractId             NUMERIC,
-                State               TEXT,
-                County              TEXT,
-                TotalPop            INTEGER,
-                Men                 INTEGER,
-                Women               INTEGER,
-                Hispanic            DECIMAL,
-                White               DECIMAL,
-                Black               DECIMAL,
-                Native              DECIMAL,
-                Asian               DECIMAL,
-                Pacific             DECIMAL,
-                VotingAgeCitizen    DECIMAL,
-                Income              DECIMAL,
-                IncomeErr           DECIMAL,
-                IncomePerCap        DECIMAL,
-                IncomePerCapErr     DECIMAL,
-                Poverty             DECIMAL,
-                ChildPoverty        DECIMAL,
-                Professional        DECIMAL,
-                Service             DECIMAL,
-                Office              DECIMAL,
-                Construction        DECIMAL,
-                Production          DECIMAL,
-                Drive               DECIMAL,
-                Carpool             DECIMAL,
-                Transit             DECIMAL,
-                Walk                DECIMAL,
-                OtherTransp         DECIMAL,
-                WorkAtHome          DECIMAL,
-                MeanCommute         DECIMAL,
-                Employed            INTEGER,
-                PrivateWork         DECIMAL,
-                PublicWork          DECIMAL,
-                SelfEmployed        DECIMAL,
-                FamilyWork          DECIMAL,
-                Unemployment        DECIMAL
-            );  
+            DROP TABLE IF EXISTS {table};
+            CREATE {'UNLOGGED ' if unlogged else ''}TABLE {table} (
+                {columns}
+            );
         """)
 
         #   ALTER TABLE {TableName} ADD PRIMARY KEY (TractId);
         #   CREATE INDEX idx_{TableName}_State ON {TableName}(State);
-        print(f"Created {TableName}")
+        print(f"Created {table}")
 
 def load(conn, icmdlist):
 
@@ -169,51 +207,563 @@ def load(conn, icmdlist):
 
         elapsed = time.perf_counter() - start
         print(f'Finished Loading. Elapsed Time: {elapsed:0.4} seconds')
+
+# convert one DictReader row into a list of column values in table order,
+# with empty fields as None so they load as NULL (an empty CSV field in COPY)
+def clean_row(row):
+    return [val if val else None for val in row.values()]
+
 def load_copy(conn, rowlist):
-	print(f"Loading {len(rowlist)} rows using COPY")
-	start = time.perf_counter()
+    print(f"Loading {len(rowlist)} rows using COPY")
+    start = time.perf_counter()
+
+    output = StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+
+    for row in rowlist:
+        writer.writerow(clean_row(row))
+
+    output.seek(0)
+
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {TableName} FROM STDIN WITH (FORMAT csv)", output)
+        print("COPY complete.")
+
+    elapsed = time.perf_counter() - start
+    print(f'Finished Loading. Elapsed Time: {elapsed:.4f} seconds')
+    return len(rowlist)
+
+# file-like object that COPY reads from; it pulls cleaned rows from the
+# csv reader on demand so only about one chunk of text is ever held in memory
+class CopyStream:
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.writer = csv.writer(self, quoting=csv.QUOTE_MINIMAL)
+        self.pending = []
+        self.buffered = 0
+        self.rowcount = 0
+
+    # called by csv.writer for every formatted row
+    def write(self, text):
+        self.pending.append(text)
+        self.buffered += len(text)
+
+    # called by psycopg2 copy_expert until it returns an empty string
+    def read(self, size=-1):
+        while size < 0 or self.buffered < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            self.writer.writerow(clean_row(row))
+            self.rowcount += 1
+
+        data = ''.join(self.pending)
+        if size < 0 or len(data) <= size:
+            self.pending = []
+            self.buffered = 0
+            return data
+
+        self.pending = [data[size:]]
+        self.buffered = len(data) - size
+        return data[:size]
+
+
+# stream the data file straight into COPY without building any row lists
+def load_stream(conn, fname):
+    print(f"Streaming {fname} using COPY in {ChunkSize} character chunks")
+    start = time.perf_counter()
+
+    stream = CopyStream(readrows(fname))
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {TableName} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+    print("COPY complete.")
+
+    elapsed = time.perf_counter() - start
+    print(f'Finished Loading {stream.rowcount} rows. Elapsed Time: {elapsed:.4f} seconds '
+          f'({stream.rowcount / elapsed:.0f} rows/sec)')
+    return stream.rowcount
+
+# per-row INSERTs, one autocommitted statement each (the original slow path)
+def load_insert(conn, fname):
+    cmdlist = getSQLcmnds(readdata(fname))
+    load(conn, cmdlist)
+    return len(cmdlist)
+
+# per-row INSERTs, but all of them inside a single transaction
+def load_transaction(conn, fname):
+    cmdlist = getSQLcmnds(readdata(fname))
+    conn.autocommit = False
+    try:
+        with conn:
+            load(conn, cmdlist)
+    finally:
+        conn.autocommit = True
+    return len(cmdlist)
+
+# one parameterized INSERT handed every row through cursor.executemany
+def load_executemany(conn, fname):
+    rows = [clean_row(row) for row in readdata(fname)]
+    if not rows:
+        return 0
+
+    placeholders = ', '.join(['%s'] * len(rows[0]))
+    with conn.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {TableName} VALUES ({placeholders})", rows)
+    return len(rows)
+
+# multi-row INSERT ... VALUES (...), (...) statements of BatchSize rows each
+def load_values(conn, fname):
+    rows = [clean_row(row) for row in readdata(fname)]
+    print(f"Loading {len(rows)} rows in batches of {BatchSize}")
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(cursor, f"INSERT INTO {TableName} VALUES %s", rows, page_size=BatchSize)
+    return len(rows)
+
+def load_copy_file(conn, fname):
+    return load_copy(conn, readdata(fname))
+
+# stream into a temp table with COPY, then move the rows over in one statement
+def load_temp_copy(conn, fname):
+    stage = f"{TableName}_tmp"
+    stream = CopyStream(readrows(fname))
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            DROP TABLE IF EXISTS {stage};
+            CREATE TEMP TABLE {stage} (LIKE {TableName});
+        """)
+        cursor.copy_expert(f"COPY {stage} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+        cursor.execute(f"INSERT INTO {TableName} SELECT * FROM {stage}")
+        cursor.execute(f"DROP TABLE {stage}")
+    print(f"Moved {stream.rowcount} rows from {stage} into {TableName}")
+    return stream.rowcount
+
+# split the data file (after the header line) into n byte ranges of about equal size
+def partitions(fname, n):
+    with open(fname, mode="rb") as fil:
+        header = fil.readline()
+        data_start = len(header)
+        size = fil.seek(0, os.SEEK_END)
+
+    bounds = [data_start + (size - data_start) * i // n for i in range(n + 1)]
+    return header.decode("utf-8"), list(zip(bounds[:-1], bounds[1:]))
+
+# yield the lines that *start* inside [start, end); a line that straddles
+# start belongs to the previous range, so ranges never share or drop a row.
+# this assumes no quoted field in the data file contains a newline
+def partition_lines(fname, start, end):
+    with open(fname, mode="rb") as fil:
+        fil.seek(start - 1)
+        fil.readline()
+        while fil.tell() < end:
+            line = fil.readline()
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+# worker process: COPY one byte range of the data file over its own connection
+def load_partition(opts, fieldnames, part, start, end):
+    configure(opts)
+    begin = time.perf_counter()
+
+    conn = dbconnect()
+    rows = csv.DictReader(partition_lines(Datafile, start, end), fieldnames=fieldnames)
+    stream = CopyStream(rows)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {TableName} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+    conn.close()
+
+    elapsed = time.perf_counter() - begin
+    return {
+        "partition": part,
+        "bytes": end - start,
+        "rows": stream.rowcount,
+        "elapsed_sec": round(elapsed, 4),
+        "rows_per_sec": round(stream.rowcount / elapsed, 1) if elapsed > 0 else None,
+    }
+
+# COPY Workers partitions of the data file concurrently, one connection each
+def load_parallel(conn, fname):
+    header, ranges = partitions(fname, Workers)
+    fieldnames = next(csv.reader([header]))
+    print(f"Loading {fname} with {Workers} workers")
+
+    with ProcessPoolExecutor(max_workers=Workers) as pool:
+        futures = [pool.submit(load_partition, Options, fieldnames, part, start, end)
+                   for part, (start, end) in enumerate(ranges)]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        print(f"  worker {result['partition']}: {result['rows']} rows in "
+              f"{result['elapsed_sec']:.4f} seconds ({result['rows_per_sec'] or 0:.0f} rows/sec)")
+    return sum(result["rows"] for result in results)
 
-	# Get the fieldnames from the first row
-	fieldnames = list(rowlist[0].keys())
+# load into an UNLOGGED staging table, index it there, then rename it over
+# TableName in one transaction so readers see either the old or the new table.
+# an UNLOGGED table is emptied after a crash, so pass --logged to write it
+# to the WAL once (still far cheaper than logging every row and index update)
+def load_swap(conn, fname):
+    stage = f"{TableName}_staging"
+    createTable(conn, stage, unlogged=True)
 
-	output = StringIO()
-	writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+    stream = CopyStream(readrows(fname))
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {stage} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+    print(f"Copied {stream.rowcount} rows into {stage}")
 
-	for row in rowlist:
-		cleaned = clean_row(row)
-		writer.writerow([cleaned[field] for field in fieldnames])
+    addConstraintsAndIndexes(conn, stage)
+    if SetLogged:
+        with conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {stage} SET LOGGED")
 
-	output.seek(0)
+    conn.autocommit = False
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                DROP TABLE IF EXISTS {TableName};
+                ALTER TABLE {stage} RENAME TO {TableName};
+                ALTER TABLE {TableName} RENAME CONSTRAINT {stage}_pkey TO {TableName}_pkey;
+                ALTER INDEX idx_{stage}_State RENAME TO idx_{TableName}_State;
+            """)
+    finally:
+        conn.autocommit = True
+    print(f"Swapped {stage} in as {TableName}")
+    return stream.rowcount
 
-	with conn.cursor() as cursor:
-		cursor.copy_from(output, TableName, sep=",", null='0')
-		print("COPY complete.")
+# hash of one cleaned row, used to spot tracts that changed since the last load
+def row_hash(vals):
+    text = '\x1f'.join(str(val) for val in vals)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
 
-	elapsed = time.perf_counter() - start
-	print(f'Finished Loading. Elapsed Time: {elapsed:.4f} seconds')
+def read_manifest(fname):
+    if not os.path.exists(fname):
+        return {}
+    with open(fname) as f:
+        return json.load(f)
 
+# write to a temp file and rename it so a crash never leaves half a manifest
+def write_manifest(fname, hashes):
+    with open(fname + ".tmp", "w") as f:
+        json.dump(hashes, f)
+    os.replace(fname + ".tmp", fname)
 
-def addConstraintsAndIndexes(conn):
+# only send rows that are new or changed since the previous run (according to
+# the manifest) through INSERT ... ON CONFLICT, and delete tracts that vanished.
+# needs the TractId primary key, so the table must already have its constraints
+def load_upsert(conn, fname):
+    stage = f"{TableName}_upsert"
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM {TableName} LIMIT 1")
+        columns = [desc[0] for desc in cursor.description]
+        table_empty = cursor.fetchone() is None
+
+    # an empty table means the manifest no longer describes what is loaded
+    previous = {} if table_empty else read_manifest(Manifest)
+    current = {}
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
+
+    def changed_rows():
+        for row in readrows(fname):
+            vals = clean_row(row)
+            key = str(vals[0])
+            digest = row_hash(vals)
+            current[key] = digest
+            if key not in previous:
+                counts["new"] += 1
+            elif previous[key] != digest:
+                counts["changed"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            yield row
+
+    updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in columns[1:])
+    stream = CopyStream(changed_rows())
+    conn.autocommit = False
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {stage} (LIKE {TableName}) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY {stage} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+            cursor.execute(f"""
+                INSERT INTO {TableName} SELECT * FROM {stage}
+                ON CONFLICT ({columns[0]}) DO UPDATE SET {updates}
+            """)
+            deleted = [key for key in previous if key not in current]
+            if deleted:
+                cursor.execute(f"DELETE FROM {TableName} WHERE {columns[0]} = ANY(%s::numeric[])", (deleted,))
+    finally:
+        conn.autocommit = True
+
+    write_manifest(Manifest, current)
+    print(f"Upserted {stream.rowcount} rows ({counts['new']} new, {counts['changed']} changed), "
+          f"skipped {counts['unchanged']} unchanged, deleted {len(deleted)}")
+    return stream.rowcount
+
+# pandas dtype for each Postgres column type; Int64 is pandas' nullable integer
+FrameTypes = {"NUMERIC": "float64", "DECIMAL": "float64", "INTEGER": "Int64", "TEXT": "string"}
+
+# read the data file as typed DataFrame chunks of FrameRows rows. every column
+# is converted in one pass by pandas' C parser and empty fields stay missing
+def read_frames(fname):
+    names = [name for name, sqltype in Columns]
+    dtypes = {name: FrameTypes[sqltype] for name, sqltype in Columns}
+    frames = pd.read_csv(fname, header=0, names=names, dtype=dtypes, chunksize=FrameRows, nrows=RowLimit)
+    yield from frames
+
+# render a cleaned chunk as COPY csv text; missing values are written as
+# empty fields, which COPY loads as NULL. NUMERIC columns are floats here, so
+# each is written as its shortest text without the ".0" pandas adds to whole
+# numbers, and an integral value loads as 1001 rather than 1001.0
+def frame_to_copy(df):
+    floats = df.select_dtypes('float64').columns
+    df = df.assign(**{name: df[name].astype('string').str.removesuffix('.0') for name in floats})
+    output = StringIO()
+    df.to_csv(output, header=False, index=False, na_rep='')
+    return output.getvalue()
+
+# file-like object that COPY reads from. chunks yields (data, rows) pairs of
+# already rendered COPY text or bytes, and only one of them is buffered at a time
+class FrameStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = None
+        self.rowcount = 0
+
+    def read(self, size=-1):
+        parts = []
+        wanted = size
+        while True:
+            if self.buffer is not None:
+                data = self.buffer.read(wanted)
+                parts.append(data)
+                if size >= 0:
+                    wanted -= len(data)
+                    if wanted == 0:
+                        break
+            try:
+                data, rows = next(self.chunks)
+            except StopIteration:
+                break
+            self.buffer = BytesIO(data) if isinstance(data, bytes) else StringIO(data)
+            self.rowcount += rows
+
+        return parts[0][:0].join(parts) if parts else ''
+
+# COPY the data file through the typed, column-at-a-time cleaner
+def load_frames(conn, fname):
+    print(f"Loading {fname} using COPY in chunks of {FrameRows} rows")
+    stream = FrameStream((frame_to_copy(df), len(df)) for df in read_frames(fname))
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {TableName} FROM STDIN WITH (FORMAT csv)", stream, size=ChunkSize)
+    print("COPY complete.")
+    return stream.rowcount
+
+# PGCOPY binary format: a fixed signature, flags and header extension length,
+# then one (field count, (length, bytes) per field) tuple per row and a -1 trailer
+BinaryHeader = b'PGCOPY\n\xff\r\n\x00' + bytes(8)
+BinaryTrailer = b'\xff\xff'
+BinaryRows = 16384  # rows encoded per numpy pass, bounds the size of the byte matrices
+MaxNumericScale = 6  # most decimal places a float may have to be packed into NUMERIC
+
+# every field is a (n, width) uint8 matrix plus how many bytes of each row
+# are used; fields start with their big-endian int32 length, -1 meaning NULL
+def field_lengths(lengths, nulls):
+    lengths = np.where(nulls, -1, lengths).astype('>i4')
+    return lengths.view(np.uint8).reshape(-1, 4)
+
+def int4_field(values):
+    nulls = values.isna().to_numpy()
+    data = values.fillna(0).to_numpy(dtype='>i4').view(np.uint8).reshape(-1, 4)
+    used = np.where(nulls, 4, 8)
+    return np.hstack([field_lengths(4, nulls), data]), used
+
+def text_field(values):
+    encoded = values.str.encode('utf-8')
+    nulls = encoded.isna().to_numpy()
+    lengths = encoded.str.len().fillna(0).to_numpy(dtype=np.int64)
+    width = max(int(lengths.max()), 1)
+    data = np.array(encoded.fillna(b'').tolist(), dtype=f'S{width}').view(np.uint8).reshape(-1, width)
+    return np.hstack([field_lengths(lengths, nulls), data]), 4 + np.where(nulls, 0, lengths)
+
+# NUMERIC is sent as base-10000 digits: (ndigits, weight, sign, dscale, digits...).
+# each value gets the smallest decimal scale that represents it exactly, is scaled
+# to an integer aligned on a 4 digit boundary, and split into digits arithmetically
+def numeric_field(values):
+    x = values.to_numpy(dtype=np.float64)
+    nulls = np.isnan(x)
+    x = np.where(nulls, 0.0, x)
+    magnitude = np.abs(x)
+
+    scale = np.full(len(x), -1)
+    for d in range(MaxNumericScale, -1, -1):
+        shifted = magnitude * 10.0 ** d
+        scale[np.abs(shifted - np.rint(shifted)) <= np.maximum(shifted * 1e-14, 1e-9)] = d
+
+    # a value that needs more than MaxNumericScale decimals, or whose scaled
+    # integer does not fit an int64, cannot be packed without changing it
+    frac_groups = (np.maximum(scale, 0) + 3) // 4
+    shifted = magnitude * 10.0 ** (frac_groups * 4)
+    inexact = (scale < 0) | (shifted >= 2.0 ** 63)
+    if inexact.any():
+        raise ValueError(f"{values.name} value {float(x[inexact][0])!r} cannot be sent exactly as binary NUMERIC; "
+                         f"use a text COPY strategy such as 'frames' or 'stream'")
+    scaled = np.rint(shifted).astype(np.int64)
+    ndigits = max(len(str(int(scaled.max()))) + 3, 4) // 4 if len(x) else 1
+
+    out = np.empty((len(x), 4 + ndigits), dtype='>i2')
+    out[:, 0] = ndigits
+    out[:, 1] = ndigits - 1 - frac_groups
+    out[:, 2] = np.where(x < 0, 0x4000, 0x0000)
+    out[:, 3] = scale
+    for i in range(ndigits):
+        out[:, 4 + i] = (scaled // 10000 ** (ndigits - 1 - i)) % 10000
+
+    data = out.view(np.uint8).reshape(len(x), -1)
+    used = np.where(nulls, 4, 4 + data.shape[1])
+    return np.hstack([field_lengths(data.shape[1], nulls), data]), used
+
+BinaryFields = {"NUMERIC": numeric_field, "DECIMAL": numeric_field, "INTEGER": int4_field, "TEXT": text_field}
+
+# encode a typed chunk as PGCOPY tuples. the per-field matrices are laid side
+# by side and a boolean mask of the used bytes flattens them, row by row, into
+# the variable length tuples COPY expects, without a Python loop over rows
+def frame_to_binary(df):
+    parts = []
+    for start in range(0, len(df), BinaryRows):
+        chunk = df.iloc[start:start + BinaryRows]
+        count = np.full(len(chunk), len(Columns), dtype='>i2').view(np.uint8).reshape(-1, 2)
+        matrices = [count]
+        masks = [np.ones(count.shape, dtype=bool)]
+        for name, sqltype in Columns:
+            matrix, used = BinaryFields[sqltype](chunk[name])
+            matrices.append(matrix)
+            masks.append(np.arange(matrix.shape[1]) < used[:, None])
+        parts.append(np.hstack(matrices)[np.hstack(masks)].tobytes())
+    return b''.join(parts)
+
+def binary_chunks(frames):
+    yield BinaryHeader, 0
+    for df in frames:
+        yield frame_to_binary(df), len(df)
+    yield BinaryTrailer, 0
+
+# COPY the data file in PGCOPY binary format so Postgres never parses number text
+def load_binary(conn, fname):
+    print(f"Loading {fname} using binary COPY in chunks of {FrameRows} rows")
+    stream = FrameStream(binary_chunks(read_frames(fname)))
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {TableName} FROM STDIN WITH (FORMAT binary)", stream, size=ChunkSize)
+    print("COPY complete.")
+    return stream.rowcount
+
+# every load strategy takes (conn, fname) and returns the number of rows loaded
+Strategies = {
+    "insert": load_insert,
+    "transaction": load_transaction,
+    "executemany": load_executemany,
+    "values": load_values,
+    "copy": load_copy_file,
+    "tempcopy": load_temp_copy,
+    "stream": load_stream,
+    "frames": load_frames,
+    "binary": load_binary,
+    "parallel": load_parallel,
+    "swap": load_swap,
+    "upsert": load_upsert,
+}
+
+# strategies that need the primary key in place before they load
+KeyedStrategies = {"upsert"}
+
+# peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss / 1024
+
+# run one strategy and return a machine-readable summary of how it did
+def run_strategy(conn, name, fname):
+    start = time.perf_counter()
+    rows = Strategies[name](conn, fname)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "strategy": name,
+        "datafile": fname,
+        "rows": rows,
+        "elapsed_sec": round(elapsed, 4),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "batchsize": BatchSize,
+        "chunksize": ChunkSize,
+    }
+
+# print a summary as one JSON line and optionally append it to SummaryFile
+def report(summary):
+    line = json.dumps(summary)
+    print(line)
+    if SummaryFile:
+        with open(SummaryFile, "a") as f:
+            f.write(line + "\n")
+
+# runs inside a fresh worker process so peak RSS belongs to this strategy alone
+def benchmark_strategy(opts, name):
+    configure(opts)
+    conn = dbconnect()
+    createTable(conn)
+    if name in KeyedStrategies:
+        addConstraintsAndIndexes(conn)
+    summary = run_strategy(conn, name, Datafile)
+    conn.close()
+    return summary
+
+# load the data file once with each strategy (all of them by default), each on
+# a freshly created table
+def benchmark(opts, names=Strategies):
+    results = []
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            summary = pool.submit(benchmark_strategy, opts, name).result()
+        report(summary)
+        results.append(summary)
+
+    print("\nStrategy     |     Rows |  Seconds |    Rows/sec | Peak RSS MB")
+    print("-" * 64)
+    for summary in sorted(results, key=lambda x: x["elapsed_sec"]):
+        print(f"{summary['strategy']:12} | {summary['rows']:8} | {summary['elapsed_sec']:8.3f} | "
+              f"{summary['rows_per_sec'] or 0:11.1f} | {summary['peak_rss_mb']:11.1f}")
+    return results
+
+
+def addConstraintsAndIndexes(conn, table=TableName):
     with conn.cursor() as cursor:
         cursor.execute(f"""
-            ALTER TABLE {TableName} ADD PRIMARY KEY (TractId);
-            CREATE INDEX idx_{TableName}_State ON {TableName}(State);
+            ALTER TABLE {table} ADD PRIMARY KEY (TractId);
+            CREATE INDEX idx_{table}_State ON {table}(State);
         """)
         print("Constraints and indexes added.")
 def main():
-    initialize()
+    opts = initialize()
+    if CompareCopy:
+        # same typed frames either way, rendered as CSV text or as PGCOPY binary
+        benchmark(opts, ["frames", "binary"])
+        return
+    if Benchmark:
+        benchmark(opts)
+        return
+
     conn = dbconnect()
-    rlis = readdata(Datafile)
-    cmdlist = getSQLcmnds(rlis)
-    if CreateDB:
+    # the swap strategy builds its own table, constraints and indexes
+    rebuild = CreateDB and Strategy != "swap"
+    if rebuild:
         createTable(conn)
+        if Strategy in KeyedStrategies:
+            addConstraintsAndIndexes(conn)
 
-    load_copy(conn, cmdlist)
+    report(run_strategy(conn, Strategy, Datafile))
 
-    if CreateDB:
+    if rebuild and Strategy not in KeyedStrategies:
         addConstraintsAndIndexes(conn)
 if __name__ == "__main__":
     main()
-
-
-
@@ -1,53 +1,282 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse
+import time
+import os
+import resource
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
+COLUMNS = [
+    "EVENT_NO_TRIP",
+    "EVENT_NO_STOP",
+    "OPD_DATE",
+    "VEHICLE_ID",
+    "METERS",
+    "ACT_TIME",
+    "GPS_LONGITUDE",
+    "GPS_LATITUDE"
+]
+OPD_DATE_FORMAT = '%d%b%Y:%H:%M:%S'
+
+# Compact dtypes for streaming day-sized files: trip, stop and vehicle ids and
+# meters all fit in int32, GPS needs ~7 significant digits and a file holds
+# only a couple of distinct OPD_DATE strings
+DTYPES = {
+    "EVENT_NO_TRIP": "int32",
+    "EVENT_NO_STOP": "int32",
+    "OPD_DATE": "category",
+    "VEHICLE_ID": "int32",
+    "METERS": "int32",
+    "ACT_TIME": "int32",
+    "GPS_LONGITUDE": "float32",
+    "GPS_LATITUDE": "float32",
+}
+CHUNKSIZE = 1000000  # rows per chunk in load_data_chunked
+PARTITION_COLS = ["OPD_DATE", "VEHICLE_ID"]  # directory levels of the Parquet output
+
 def create_timestamp(row):
-    base_date = datetime.strptime(row['OPD_DATE'], '%d%b%Y:%H:%M:%S')
-    
+    base_date = datetime.strptime(row['OPD_DATE'], OPD_DATE_FORMAT)
+
     time_delta = timedelta(seconds=int(row['ACT_TIME']))
-    
+
     return base_date + time_delta
 
-def load_data(file_path: str) -> pd.DataFrame:
-    df = pd.read_csv(file_path, usecols=[
-        "EVENT_NO_TRIP",
-        "EVENT_NO_STOP",
-        "OPD_DATE",
-        "VEHICLE_ID",
-        "METERS",
-        "ACT_TIME",
-        "GPS_LONGITUDE",
-        "GPS_LATITUDE"
-    ])
-    
+# Parse each distinct OPD_DATE string once (a day file has only one or two)
+# and spread the results back over the rows
+def parse_opd_dates(opd_date):
+    codes, uniques = pd.factorize(opd_date)
+    parsed = pd.to_datetime(uniques, format=OPD_DATE_FORMAT)
+    return pd.Series(parsed[codes], index=opd_date.index)
+
+# Vectorized TIMESTAMP: the parsed OPD_DATE plus ACT_TIME seconds as a timedelta column
+def add_timestamp(df):
+    df['TIMESTAMP'] = parse_opd_dates(df['OPD_DATE']) + pd.to_timedelta(df['ACT_TIME'], unit='s')
+    return df
+
+# Speed in km/h from consecutive rows: (meters / 1000) / (seconds / 3600),
+# 0 where there is no earlier row or no time has passed
+def speed_kmh(d_meters, d_seconds):
+    d_meters = np.asarray(d_meters, dtype=np.float64)
+    d_seconds = np.asarray(d_seconds, dtype=np.float64)
+    valid = d_seconds > 0  # False for NaN too
+    speed = np.zeros(len(d_seconds))
+    speed[valid] = (d_meters[valid] / 1000) / (d_seconds[valid] / 3600)
+    return speed
+
+# SPEED within each trip: one sort on (EVENT_NO_TRIP, TIMESTAMP), then diffs
+# over the whole frame with the first row of every trip masked out, so no
+# delta is ever taken against another bus's breadcrumb. carry, if given, holds
+# the last TIMESTAMP and METERS of trips seen in earlier chunks (indexed by
+# EVENT_NO_TRIP) and is used instead of masking for those trips' first rows
+def compute_speed(df, carry=None):
+    df = df.sort_values(['EVENT_NO_TRIP', 'TIMESTAMP'], kind='stable')
+
+    trip = df['EVENT_NO_TRIP'].to_numpy()
+    new_trip = np.ones(len(df), dtype=bool)
+    new_trip[1:] = trip[1:] != trip[:-1]
+
+    dtime = df['TIMESTAMP'].diff().dt.total_seconds().to_numpy(dtype=np.float64, copy=True)  # Time difference in seconds
+    dmeters = df['METERS'].diff().to_numpy(dtype=np.float64, copy=True)  # Distance difference in meters
+    dtime[new_trip] = np.nan
+    dmeters[new_trip] = np.nan
+
+    if carry is not None and len(carry):
+        prev = carry.reindex(trip[new_trip])
+        first = df.iloc[new_trip]
+        dtime[new_trip] = (first['TIMESTAMP'].to_numpy() - prev['TIMESTAMP'].to_numpy()) / np.timedelta64(1, 's')
+        dmeters[new_trip] = first['METERS'].to_numpy() - prev['METERS'].to_numpy()
+
+    df['SPEED'] = speed_kmh(dmeters, dtime)
+    return df
+
+# Split the frame into one partition of whole trips per worker and run
+# compute_speed on each in a process pool
+def compute_speed_parallel(df, workers):
+    partitions = [part for _, part in df.groupby(df['EVENT_NO_TRIP'] % workers, sort=False)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(compute_speed, partitions))
+    return pd.concat(parts).sort_values(['EVENT_NO_TRIP', 'TIMESTAMP'], kind='stable')
+
+# Stream a breadcrumb CSV in chunks with compact dtypes, yielding each chunk
+# with TIMESTAMP and SPEED added. The last breadcrumb of every trip is carried
+# into the next chunk so speeds stay continuous across chunk boundaries; this
+# relies on each trip's rows appearing in time order in the file, as they do
+# in the TriMet extracts. Memory is bounded by the chunk size plus one row per trip
+def iter_transformed(file_path, chunksize=CHUNKSIZE, drop=("EVENT_NO_STOP", "OPD_DATE", "ACT_TIME")):
+    carry = None
+    reader = pd.read_csv(file_path, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize)
+    for df in reader:
+        df = compute_speed(add_timestamp(df), carry)
+        df['SPEED'] = df['SPEED'].astype(np.float32)
+
+        trip = df['EVENT_NO_TRIP'].to_numpy()
+        last_of_trip = np.ones(len(df), dtype=bool)
+        last_of_trip[:-1] = trip[:-1] != trip[1:]
+        latest = df.loc[last_of_trip, ['EVENT_NO_TRIP', 'TIMESTAMP', 'METERS']].set_index('EVENT_NO_TRIP')
+        carry = latest if carry is None else pd.concat([carry, latest])
+        carry = carry[~carry.index.duplicated(keep='last')]
+
+        yield df.drop(columns=list(drop))
+
+# Transform a file of any size chunk by chunk, appending each chunk to a CSV
+def load_data_chunked(file_path, out_path, chunksize=CHUNKSIZE):
+    rows = 0
+    start = time.perf_counter()
+    for i, df in enumerate(iter_transformed(file_path, chunksize)):
+        df.to_csv(out_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows += len(df)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+    print(f"Wrote {rows} breadcrumbs to {out_path} in {elapsed:.2f} seconds "
+          f"({rows / elapsed:.0f} rows/sec, peak RSS {peak_mb:.0f} MB)")
+    return rows
+
+# Remove the partition directories and Parquet files an earlier write_parquet
+# left in out_dir; write_to_dataset only ever adds files
+def clear_dataset(out_dir):
+    if not os.path.isdir(out_dir):
+        return
+    for entry in os.scandir(out_dir):
+        if entry.is_dir() and '=' in entry.name:
+            shutil.rmtree(entry.path)
+        elif entry.name.endswith('.parquet'):
+            os.remove(entry.path)
+
+# Transform a file chunk by chunk into a Parquet dataset partitioned by
+# OPD_DATE (as YYYY-MM-DD) and VEHICLE_ID, keeping the compact column types.
+# Whatever dataset out_dir held before is replaced
+def write_parquet(file_path, out_dir, chunksize=CHUNKSIZE):
+    clear_dataset(out_dir)
+    rows = 0
+    start = time.perf_counter()
+    for i, df in enumerate(iter_transformed(file_path, chunksize, drop=("EVENT_NO_STOP", "ACT_TIME"))):
+        df['OPD_DATE'] = parse_opd_dates(df['OPD_DATE'].astype(str)).dt.strftime('%Y-%m-%d')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(table, out_dir, partition_cols=PARTITION_COLS,
+                            basename_template=f"part-{i}-{{i}}.parquet")
+        rows += len(df)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {rows} breadcrumbs to {out_dir} in {elapsed:.2f} seconds ({rows / elapsed:.0f} rows/sec)")
+    return rows
+
+# Read a Parquet dataset written by write_parquet. Only the requested columns
+# are decoded and filters such as [("VEHICLE_ID", "=", 4223)] skip whole
+# partition directories and row groups instead of filtering after the read
+def read_parquet(path, columns=None, filters=None):
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+def load_data(file_path: str, workers: int = 1) -> pd.DataFrame:
+    df = pd.read_csv(file_path, usecols=COLUMNS)
+
+    df = add_timestamp(df)
+
+    if workers > 1:
+        df = compute_speed_parallel(df, workers)
+    else:
+        df = compute_speed(df)
+
+    df = df.drop("EVENT_NO_STOP", axis=1)
+    df = df.drop("OPD_DATE", axis=1)
+    df = df.drop("ACT_TIME", axis=1)
+    #df = df.drop("GPS_SATELLITES", axis=1)
+    #df = df.drop("GPS_HDOP", axis=1)
+
+    return df
+
+# The original row-by-row implementation, kept as the reference for benchmark()
+def load_data_apply(file_path: str) -> pd.DataFrame:
+    df = pd.read_csv(file_path, usecols=COLUMNS)
+
     df['TIMESTAMP'] = df.apply(create_timestamp, axis=1)
-    
+
     df = df.sort_values('TIMESTAMP')
-    
+
     df['dTIME'] = df['TIMESTAMP'].diff().dt.total_seconds()  # Time difference in seconds
     df['dMETERS'] = df['METERS'].diff()  # Distance difference in meters
-    
+
     # Calculate speed in km/h: (meters / 1000) / (seconds / 3600)
-    df['SPEED'] = df.apply(lambda x: 
-                          (x['dMETERS'] / 1000) / (x['dTIME'] / 3600) 
-                          if pd.notna(x['dTIME']) and x['dTIME'] > 0 
+    df['SPEED'] = df.apply(lambda x:
+                          (x['dMETERS'] / 1000) / (x['dTIME'] / 3600)
+                          if pd.notna(x['dTIME']) and x['dTIME'] > 0
                           else 0, axis=1)
-    
+
     df = df.drop(['dTIME', 'dMETERS'], axis=1)
-    
+
     df = df.drop("EVENT_NO_STOP", axis=1)
     df = df.drop("OPD_DATE", axis=1)
     df = df.drop("ACT_TIME", axis=1)
-    #df = df.drop("GPS_SATELLITES", axis=1)
-    #df = df.drop("GPS_HDOP", axis=1)
-    
+
     return df
 
+# Write a synthetic breadcrumb CSV shaped like a TriMet day file: rows trips
+# of about 500 breadcrumbs each, 5 seconds and a few meters apart
+def make_synthetic_file(file_path, rows, trip_length=500, seed=0):
+    rng = np.random.default_rng(seed)
+    trip = np.arange(rows) // trip_length
+    step = np.arange(rows) % trip_length
+    df = pd.DataFrame({
+        "EVENT_NO_TRIP": 259172515 + trip,
+        "EVENT_NO_STOP": 259172517 + trip * 40 + step // 12,
+        "OPD_DATE": np.where(trip % 7 == 0, "16FEB2023:00:00:00", "15FEB2023:00:00:00"),
+        "VEHICLE_ID": 4000 + trip % 300,
+        "METERS": step * 40 + rng.integers(0, 20, rows),
+        "ACT_TIME": 20000 + (trip % 50) * 1200 + step * 5,
+        "GPS_LONGITUDE": -122.6 + rng.normal(0, 0.05, rows).round(6),
+        "GPS_LATITUDE": 45.5 + rng.normal(0, 0.05, rows).round(6),
+        "GPS_SATELLITES": 12,
+        "GPS_HDOP": 0.7,
+    })
+    df.to_csv(file_path, index=False)
+
+# Time the row-wise apply path against the vectorized one on a synthetic file.
+# The apply path diffs across trips, so only the timestamps are compared
+def benchmark(rows, file_path="synthetic_breadcrumbs.csv", workers=1):
+    if not os.path.exists(file_path):
+        print(f"Writing {rows} synthetic breadcrumbs to {file_path}...")
+        make_synthetic_file(file_path, rows)
+
+    start = time.perf_counter()
+    vectorized = load_data(file_path, workers)
+    vectorized_time = time.perf_counter() - start
+    print(f"vectorized: {vectorized_time:.2f} seconds ({len(vectorized) / vectorized_time:.0f} rows/sec)")
+
+    start = time.perf_counter()
+    applied = load_data_apply(file_path)
+    applied_time = time.perf_counter() - start
+    print(f"apply:      {applied_time:.2f} seconds ({len(applied) / applied_time:.0f} rows/sec)")
+
+    same = np.array_equal(np.sort(vectorized['TIMESTAMP'].to_numpy()), np.sort(applied['TIMESTAMP'].to_numpy()))
+    print(f"Speedup: {applied_time / vectorized_time:.1f}x (timestamps match: {same})")
+
 if __name__ == "__main__":
-    file_path = "bc_trip259172515_230215.csv"
-    data = load_data(file_path)
-    print("\n", data.head())
-    print(f"\nNumber of breadcrumbs: {len(data)}")
-    
-    print("\nSpeed statistics (km/h):")
-    print(data['SPEED'].describe())
+    parser = argparse.ArgumentParser(description="Add TIMESTAMP and SPEED to a breadcrumb CSV")
+    parser.add_argument("file_path", nargs="?", default="bc_trip259172515_230215.csv")
+    parser.add_argument("--benchmark", action="store_true", help="compare apply and vectorized on synthetic data")
+    parser.add_argument("--rows", type=int, default=2000000, help="size of the synthetic benchmark file")
+    parser.add_argument("--workers", type=int, default=1, help="processes used to compute per-trip speeds")
+    parser.add_argument("--output", default=None, help="stream the file in chunks and write the result here")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--parquet", default=None, help="write a Parquet dataset partitioned by date and vehicle here")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.rows, workers=args.workers)
+    elif args.parquet:
+        write_parquet(args.file_path, args.parquet, args.chunksize)
+    elif args.output:
+        load_data_chunked(args.file_path, args.output, args.chunksize)
+    else:
+        data = load_data(args.file_path, args.workers)
+        print("\n", data.head())
+        print(f"\nNumber of breadcrumbs: {len(data)}")
+
+        print("\nSpeed statistics (km/h):")
+        print(data['SPEED'].describe())
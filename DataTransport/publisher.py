@@ -1,17 +1,24 @@
 from google.cloud import pubsub_v1
 from google.oauth2 import service_account
+from google.auth.credentials import AnonymousCredentials
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import requests
+import argparse
+import threading
+import time
 import json
+import os
 from datetime import datetime
 
-# Explicitly load credentials from the key file.
-credentials = service_account.Credentials.from_service_account_file(
-    "/Users/christophersloggett/CS410_DataEng/DataTransport/key.json"
-)
-publisher = pubsub_v1.PublisherClient(credentials=credentials)
-topic_path = "projects/bubsub69/subscriptions/bus_data-sub"  
+KEY_FILE = "/Users/christophersloggett/CS410_DataEng/DataTransport/key.json"
+topic_path = "projects/bubsub69/subscriptions/bus_data-sub"
 
-message_counter = 0
+# Batching and flow control defaults
+MAX_MESSAGES = 1000       # messages per publish batch
+MAX_BYTES = 1024 * 1024   # bytes per publish batch
+MAX_LATENCY = 0.05        # seconds a batch may wait to fill up
+MAX_IN_FLIGHT = 10000     # unacknowledged publishes before publish() blocks
+FETCH_WORKERS = 8         # buses fetched from the API at the same time
 
 bus_ids = [ 2901,2914,2922,2938,3009,3010,3016,3018,3019,3021,3023,3031,3032,3033,3034,3038,3042,3045,3102,3104,
             3108,3112,3113,3117,3123,3124,3125,3127,3130,3134,3139,3140,3143,3145,3153,3157,3160,3163,3202,3203,
@@ -19,39 +26,140 @@ bus_ids = [ 2901,2914,2922,2938,3009,3010,3016,3018,3019,3021,3023,3031,3032,303
             3262,3264,3268,3305,3314,3321,3404,3409,3410,3415,3416,3419,3501,3502,3504,3505,3506,3507,3509,3511,
             3513,3514,3516,3519,3523,3524,3533,3535,3537,3542,3543,3544,3545,3546,3547,3553,3559,3566,3567,3569 ]
 
+# In-process stand-in for PublisherClient: publish() returns a future that is
+# resolved right away, so the pipeline can be exercised without Pub/Sub
+class FakePublisher:
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self.published = 0
+        self.lock = threading.Lock()
+
+    def publish(self, topic, data, **attrs):
+        future = Future()
+        with self.lock:
+            self.published += 1
+            failed = self.fail_every and self.published % self.fail_every == 0
+        if failed:
+            future.set_exception(RuntimeError("fake publish failure"))
+        else:
+            future.set_result(str(self.published))
+        return future
+
+# Build a batching PublisherClient. With PUBSUB_EMULATOR_HOST set the client
+# talks to the emulator and needs no service account key
+def make_publisher(max_messages=MAX_MESSAGES, max_bytes=MAX_BYTES, max_latency=MAX_LATENCY):
+    batch_settings = pubsub_v1.types.BatchSettings(
+        max_messages=max_messages,
+        max_bytes=max_bytes,
+        max_latency=max_latency,
+    )
+    if os.environ.get("PUBSUB_EMULATOR_HOST"):
+        credentials = AnonymousCredentials()
+    else:
+        # Explicitly load credentials from the key file.
+        credentials = service_account.Credentials.from_service_account_file(KEY_FILE)
+    return pubsub_v1.PublisherClient(batch_settings, credentials=credentials)
+
+# Tracks publish futures: bounds how many are in flight and counts outcomes
+class PublishTracker:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT):
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.published = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.first_error = None
+
+    def publish(self, publisher, data):
+        self.in_flight.acquire()
+        with self.lock:
+            self.published += 1
+            if self.published % 50000 == 0:
+                print(f"Published {self.published} messages so far...")
+        try:
+            future = publisher.publish(topic_path, data)
+        except Exception as e:
+            self.finish(e)
+            return
+        future.add_done_callback(self.on_done)
+
+    def on_done(self, future):
+        self.finish(future.exception())
+
+    def finish(self, error):
+        with self.lock:
+            if error is None:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+                if self.first_error is None:
+                    self.first_error = error
+            self.done.notify_all()
+        self.in_flight.release()
+
+    # block until every published message has succeeded or failed
+    def wait(self):
+        with self.lock:
+            while self.succeeded + self.failed < self.published:
+                self.done.wait()
+
 # Function to fetch data from the API
 def fetch_bus_data(bus_id):
     api_url = f"https://busdata.cs.pdx.edu/api/getBreadCrumbs?vehicle_id={bus_id}"
     try:
         response = requests.get(api_url)
-        response.raise_for_status()  
-        return response.json()  
+        response.raise_for_status()
+        return response.json()
     except requests.RequestException as e:
         print(f"Error fetching data for bus {bus_id}: {e}")
         return None
 
 # Function to publish messages to Pub/Sub
-def publish_message(data):
-    global message_counter
+def publish_message(publisher, tracker, data):
     try:
         message_data = json.dumps(data).encode("utf-8")
-        future = publisher.publish(topic_path, message_data)
-
-        message_counter += 1
-
-        if message_counter % 50000 == 0:
-            print(f"Published {message_counter} messages so far...")
+        tracker.publish(publisher, message_data)
     except Exception as e:
         print(f"Error publishing message: {e}")
 
-if __name__ == "__main__":
-    for bus_id in bus_ids:
-        bus_data = fetch_bus_data(bus_id)
-        if bus_data:  
-            if isinstance(bus_data, list):
+# Fetch buses on a thread pool and publish each bus's breadcrumbs as soon as
+# its response arrives, so fetching and publishing overlap
+def run(publisher, bus_ids, fetch_workers=FETCH_WORKERS, max_in_flight=MAX_IN_FLIGHT, fetch=fetch_bus_data):
+    tracker = PublishTracker(max_in_flight)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        futures = [pool.submit(fetch, bus_id) for bus_id in bus_ids]
+        for future in as_completed(futures):
+            bus_data = future.result()
+            if bus_data:
+                if isinstance(bus_data, dict):
+                    bus_data = [bus_data]
                 for data in bus_data:
-                    data["timestamp"] = datetime.now().isoformat()  
-                    publish_message(data)
-            elif isinstance(bus_data, dict):
-                bus_data["timestamp"] = datetime.now().isoformat()  
-                publish_message(bus_data)
\ No newline at end of file
+                    data["timestamp"] = datetime.now().isoformat()
+                    publish_message(publisher, tracker, data)
+
+    tracker.wait()
+    elapsed = time.perf_counter() - start
+    print(f"Published {tracker.succeeded} messages, {tracker.failed} failed, in {elapsed:.2f} seconds "
+          f"({tracker.succeeded / elapsed:.0f} messages/sec)")
+    if tracker.first_error is not None:
+        print(f"First publish error: {tracker.first_error}")
+    return tracker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish today's breadcrumbs to Pub/Sub")
+    parser.add_argument("--fake", action="store_true", help="publish to an in-process fake instead of Pub/Sub")
+    parser.add_argument("--max-messages", type=int, default=MAX_MESSAGES)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    parser.add_argument("--max-latency", type=float, default=MAX_LATENCY)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    args = parser.parse_args()
+
+    if args.fake:
+        publisher = FakePublisher()
+    else:
+        publisher = make_publisher(args.max_messages, args.max_bytes, args.max_latency)
+    run(publisher, bus_ids, args.fetch_workers, args.max_in_flight)
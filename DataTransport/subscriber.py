@@ -1,58 +1,294 @@
 from concurrent.futures import TimeoutError
 from google.cloud import pubsub_v1
 from google.oauth2 import service_account
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import StringIO
+import psycopg2
+import argparse
+import csv
+import threading
+import queue
+import time
 import os
 import json
-import atexit
 
 project_id = "bubsub69"
-subscription_id = "Subbub"  
+subscription_id = "Subbub"
 timeout = 1000.0
 
-credentials = service_account.Credentials.from_service_account_file(
-    "/Users/christophersloggett/CS410_DataEng/DataTransport/key.json"
-)
-subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
-subscription_path = subscriber.subscription_path(project_id, subscription_id)
+# Flush thresholds for the buffered writer
+FLUSH_MESSAGES = 5000       # flush once this many messages are buffered
+FLUSH_BYTES = 4 * 1024 * 1024  # ... or this many bytes
+FLUSH_INTERVAL = 1.0        # ... or when the oldest buffered message is this old (seconds)
 
-output_file = f"bus_data_{datetime.today().strftime('%Y%m%d_%H%M%S')}.json"
+# Unacked messages the client may hand us, as a multiple of the flush thresholds.
+# Messages are only acked once their batch is written, so with the client's
+# default limit (1000 messages) a batch could never fill and every flush would
+# wait out FLUSH_INTERVAL; two batches' worth lets one fill while the previous
+# one is written
+FLOW_CONTROL_BATCHES = 2
 
-with open(output_file, 'w') as f:
-    f.write('')
+# Buffers messages from the subscriber's callback threads and hands them to a
+# single writer thread in batches. Messages are acked only after their batch
+# has been written durably, and nacked if the write fails
+class BufferedSink:
+    def __init__(self, flush_messages=FLUSH_MESSAGES, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL):
+        self.flush_messages = flush_messages
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.message_counter = 0
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
 
-message_counter = 0
+    # subscriber callback: safe to call from any thread
+    def put(self, message):
+        self.queue.put(message)
 
-def callback(message: pubsub_v1.subscriber.message.Message) -> None:
-    global message_counter
-    try:
-        data = json.loads(message.data.decode('utf-8'))
-        with open(output_file, 'a') as f:
-            f.write(json.dumps(data, separators=(',', ':')) + "\n")
-        message_counter += 1
-        if message_counter % 50000 == 0:
-            print(f"Processed {message_counter} messages so far...")
-        message.ack()  
-    except Exception as e:
-        print(f"Error processing message: {e}")
-        message.nack()  
-
-def finalize_json_file():
-    if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-        with open(output_file, 'a') as f:
-            f.write('\n]')  
-
-atexit.register(finalize_json_file)
-
-streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
-print(f"Listening for messages on {subscription_path}...\n")
-
-with subscriber:
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+
+    def run(self):
+        closed = False
+        while not closed:
+            batch = []
+            size = 0
+            message = self.queue.get()
+            if message is None:
+                break
+            deadline = time.monotonic() + self.flush_interval
+            while message is not None:
+                batch.append(message)
+                size += len(message.data)
+                if len(batch) >= self.flush_messages or size >= self.flush_bytes:
+                    break
+                try:
+                    message = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            else:
+                closed = True
+            self.flush(batch)
+
+    def flush(self, batch):
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} messages: {e}")
+            for message in batch:
+                message.nack()
+            return
+
+        for message in batch:
+            message.ack()
+        before = self.message_counter
+        self.message_counter += len(batch)
+        if self.message_counter // 50000 > before // 50000:
+            print(f"Processed {self.message_counter} messages so far...")
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+# Appends each message as one JSON line to a file that stays open for the
+# whole run; every batch is a single write followed by an fsync
+class FileSink(BufferedSink):
+    def __init__(self, output_file, **kwargs):
+        self.output_file = output_file
+        self.file = open(output_file, 'wb')
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch):
+        lines = []
+        for message in batch:
+            data = message.data
+            # The payload is already JSON; only re-encode it if it would span lines
+            if b'\n' in data:
+                data = json.dumps(json.loads(data), separators=(',', ':')).encode('utf-8')
+            lines.append(data)
+            lines.append(b'\n')
+        self.file.write(b''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        super().close()
+        self.finalize_json_file()
+        self.file.close()
+
+    def finalize_json_file(self):
+        if self.file.tell() > 0:
+            self.file.write(b'\n]')
+
+# Loads each batch straight into the BreadCrumb and Trip tables: one COPY per
+# table per batch inside a single transaction, so a batch is acked only once
+# its rows are committed
+class PostgresSink(BufferedSink):
+    def __init__(self, conn, **kwargs):
+        self.conn = conn
+        self.dates = {}       # OPD_DATE string -> parsed date
+        self.last_seen = {}   # trip_id -> (seconds, meters) of its newest committed breadcrumb
+        self.trips = set()    # trip ids already in Trip
+        create_tables(conn)
+        super().__init__(**kwargs)
+
+    def opd_date(self, text):
+        if text not in self.dates:
+            self.dates[text] = datetime.strptime(text, '%d%b%Y:%H:%M:%S')
+        return self.dates[text]
+
+    def write_batch(self, batch):
+        records = []
+        for message in batch:
+            try:
+                r = json.loads(message.data)
+                records.append((int(r['EVENT_NO_TRIP']), int(r['ACT_TIME']), r['METERS'], r['OPD_DATE'],
+                                r['VEHICLE_ID'], r['GPS_LATITUDE'], r['GPS_LONGITUDE']))
+            except (ValueError, KeyError, TypeError) as e:
+                # a malformed message will never load, so it is dropped rather than redelivered forever
+                print(f"Skipping malformed message: {e}")
+        records.sort(key=lambda r: (r[0], r[1]))
+
+        crumbs = StringIO()
+        trips = StringIO()
+        crumb_writer = csv.writer(crumbs)
+        trip_writer = csv.writer(trips)
+        last_seen = {}
+        new_trips = set()
+        for trip_id, act_time, meters, opd_date, vehicle_id, lat, lon in records:
+            tstamp = self.opd_date(opd_date) + timedelta(seconds=act_time)
+            prev = last_seen.get(trip_id) or self.last_seen.get(trip_id)
+            speed = None
+            if prev and act_time > prev[0] and meters is not None and prev[1] is not None:
+                # km/h, the same unit DataTransformation/data_transport.py uses
+                speed = ((meters - prev[1]) / 1000) / ((act_time - prev[0]) / 3600)
+            # Pub/Sub does not keep order: a late, older breadcrumb must not become the reference point
+            if prev is None or act_time > prev[0]:
+                last_seen[trip_id] = (act_time, meters)
+            crumb_writer.writerow([tstamp.isoformat(), lat, lon, speed, trip_id])
+            if trip_id not in self.trips and trip_id not in new_trips:
+                new_trips.add(trip_id)
+                trip_writer.writerow([trip_id, None, vehicle_id, None, None])
+
+        crumbs.seek(0)
+        trips.seek(0)
+        with self.conn, self.conn.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE trip_stage (LIKE Trip) ON COMMIT DROP")
+            cursor.copy_expert("COPY trip_stage FROM STDIN WITH (FORMAT csv)", trips)
+            cursor.execute("INSERT INTO Trip SELECT * FROM trip_stage ON CONFLICT (trip_id) DO NOTHING")
+            cursor.copy_expert("COPY BreadCrumb (tstamp, latitude, longitude, speed, trip_id) "
+                               "FROM STDIN WITH (FORMAT csv)", crumbs)
+
+        # only remember what this batch added once it is committed
+        self.last_seen.update(last_seen)
+        self.trips.update(new_trips)
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+def create_tables(conn):
+    with conn, conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Trip (
+                trip_id         INTEGER PRIMARY KEY,
+                route_id        INTEGER,
+                vehicle_id      INTEGER,
+                service_key     TEXT,
+                direction       TEXT
+            );
+            CREATE TABLE IF NOT EXISTS BreadCrumb (
+                tstamp          TIMESTAMP,
+                latitude        FLOAT,
+                longitude       FLOAT,
+                speed           FLOAT,
+                trip_id         INTEGER REFERENCES Trip
+            );
+        """)
+
+# Stand-in for a Pub/Sub message when replaying a file instead of subscribing
+class FakeMessage:
+    def __init__(self, data):
+        self.data = data
+        self.acked = False
+        self.nacked = False
+
+    def ack(self):
+        self.acked = True
+
+    def nack(self):
+        self.nacked = True
+
+# Feed a saved breadcrumb file (a JSON array or one JSON object per line) to
+# a sink as if each record had arrived from the subscription
+def replay_file(path, sink):
+    with open(path, 'rb') as f:
+        text = f.read()
     try:
-        streaming_pull_future.result(timeout=timeout)
-    except TimeoutError:
-        print("No more messages within the timeout period.")
-        streaming_pull_future.cancel()  
-        streaming_pull_future.result()  
+        records = json.loads(text)
+        payloads = [json.dumps(r).encode('utf-8') for r in records]
+    except json.JSONDecodeError:
+        payloads = [line for line in text.splitlines() if line.strip() not in (b'', b']')]
+    for payload in payloads:
+        sink.put(FakeMessage(payload))
+    return len(payloads)
+
+def flow_control(flush_messages=FLUSH_MESSAGES, flush_bytes=FLUSH_BYTES):
+    return pubsub_v1.types.FlowControl(max_messages=flush_messages * FLOW_CONTROL_BATCHES,
+                                       max_bytes=flush_bytes * FLOW_CONTROL_BATCHES)
+
+def make_subscriber():
+    credentials = service_account.Credentials.from_service_account_file(
+        "/Users/christophersloggett/CS410_DataEng/DataTransport/key.json"
+    )
+    return pubsub_v1.SubscriberClient(credentials=credentials)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write breadcrumb messages from Pub/Sub to a dated file or to Postgres")
+    parser.add_argument("--sink", choices=["file", "postgres"], default="file")
+    parser.add_argument("--replay", default=None, help="read messages from this file instead of Pub/Sub")
+    parser.add_argument("--flush-messages", type=int, default=FLUSH_MESSAGES)
+    parser.add_argument("--flush-bytes", type=int, default=FLUSH_BYTES)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--dbname", default="postgres")
+    parser.add_argument("--user", default="postgres")
+    args = parser.parse_args()
+
+    flush = dict(flush_messages=args.flush_messages, flush_bytes=args.flush_bytes, flush_interval=args.flush_interval)
+    if args.sink == "postgres":
+        conn = psycopg2.connect(host=args.host, port=args.port, database=args.dbname,
+                                user=args.user, password=os.environ.get("PGPASSWORD"))
+        sink = PostgresSink(conn, **flush)
+        destination = f"{args.dbname} on {args.host}"
+    else:
+        output_file = f"bus_data_{datetime.today().strftime('%Y%m%d_%H%M%S')}.json"
+        sink = FileSink(output_file, **flush)
+        destination = output_file
+
+    start = time.perf_counter()
+    if args.replay:
+        count = replay_file(args.replay, sink)
+        print(f"Replayed {count} messages from {args.replay}")
+    else:
+        subscriber = make_subscriber()
+        subscription_path = subscriber.subscription_path(project_id, subscription_id)
+        streaming_pull_future = subscriber.subscribe(
+            subscription_path, callback=sink.put,
+            flow_control=flow_control(args.flush_messages, args.flush_bytes))
+        print(f"Listening for messages on {subscription_path}...\n")
+
+        with subscriber:
+            try:
+                streaming_pull_future.result(timeout=timeout)
+            except TimeoutError:
+                print("No more messages within the timeout period.")
+                streaming_pull_future.cancel()
+                streaming_pull_future.result()
+
+    sink.close()
+    print(f"{sink.message_counter} messages written to {destination} in {time.perf_counter() - start:.2f} seconds.")
 
-print(f"Messages written to {output_file}.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+ALPHA = 0.05
+NORMAL_ABOVE = 10000     # groups with more trials than this use the normal approximation
+CORRECTIONS = ['bh', 'bonferroni', 'none']
+
+# Vectorized binomial tests for many groups at once. Every function takes
+# count arrays (successes and trials per group) and does a fixed number of
+# NumPy/SciPy calls whatever the number of groups, so hundreds of thousands of
+# (vehicle, stop, day) groups cost no more Python overhead than ten.
+
+# For each group, the index i in [lo, hi] with a(i) <= target < a(i+1), where
+# a(x) = sign * binom.pmf(x, n, p) is ascending on that range. This is the
+# search stats.binomtest does for the far tail, run for all groups at once
+def search_binom_pmf(sign, target, lo, hi, n, p):
+    lo = lo.copy()
+    hi = hi.copy()
+    active = np.flatnonzero(lo < hi)
+    while len(active):
+        mid = lo[active] + (hi[active] - lo[active]) // 2
+        midval = sign[active] * stats.binom.pmf(mid, n[active], p)
+        less = midval < target[active]
+        more = midval > target[active]
+        equal = ~less & ~more
+        lo[active[less]] = mid[less] + 1
+        hi[active[more]] = mid[more] - 1
+        lo[active[equal]] = hi[active[equal]] = mid[equal]
+        active = active[lo[active] < hi[active]]
+    at_lo = sign * stats.binom.pmf(lo, n, p) <= target
+    return np.where(at_lo, lo, lo - 1)
+
+# Two-sided exact binomial test p-values for k successes out of n trials per
+# group against proportion p: the same values as stats.binomtest(k, n, p).pvalue
+def binomial_pvalues(k, n, p):
+    k = np.asarray(k, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    pvalues = np.ones(len(k))
+    d = stats.binom.pmf(k, n, p) * (1 + 1e-7)
+
+    # k below the mean: add the upper tail from the first x whose pmf is <= pmf(k)
+    low = np.flatnonzero(k < p * n)
+    if len(low):
+        kl, nl, dl = k[low], n[low], d[low]
+        ix = search_binom_pmf(-np.ones(len(low)), -dl, np.ceil(p * nl).astype(np.int64), nl, nl, p)
+        y = nl - ix + (dl == stats.binom.pmf(ix, nl, p))
+        pvalues[low] = stats.binom.cdf(kl, nl, p) + stats.binom.sf(nl - y, nl, p)
+
+    # k above the mean: add the lower tail up to the last x whose pmf is <= pmf(k)
+    high = np.flatnonzero(k > p * n)
+    if len(high):
+        kh, nh, dh = k[high], n[high], d[high]
+        ix = search_binom_pmf(np.ones(len(high)), dh, np.zeros(len(high), dtype=np.int64),
+                              np.floor(p * nh).astype(np.int64), nh, p)
+        pvalues[high] = stats.binom.cdf(ix, nh, p) + stats.binom.sf(kh - 1, nh, p)
+
+    return np.minimum(pvalues, 1.0)
+
+# Two-sided p-values from the normal approximation to the binomial, with a
+# continuity correction; close to the exact test once n * p * (1 - p) is large
+def normal_pvalues(k, n, p):
+    k = np.asarray(k, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    spread = np.sqrt(n * p * (1 - p))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.maximum(np.abs(k - n * p) - 0.5, 0) / spread
+    z = np.where(spread > 0, z, np.where(k == n * p, 0, np.inf))
+    return np.minimum(2 * stats.norm.sf(z), 1.0)
+
+# Exact p-values for groups with at most normal_above trials, normal
+# approximation for the larger ones (None: exact for all)
+def binomial_test(k, n, p, normal_above=NORMAL_ABOVE):
+    k = np.asarray(k, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    if normal_above is None:
+        return binomial_pvalues(k, n, p)
+    pvalues = np.empty(len(k))
+    large = n > normal_above
+    pvalues[~large] = binomial_pvalues(k[~large], n[~large], p)
+    pvalues[large] = normal_pvalues(k[large], n[large], p)
+    return pvalues
+
+# Adjust p-values for testing many groups at once: 'bh' controls the false
+# discovery rate (Benjamini-Hochberg), 'bonferroni' the family-wise error rate
+def adjust_pvalues(pvalues, correction='bh'):
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    m = len(pvalues)
+    if correction == 'none' or m == 0:
+        return pvalues.copy()
+    if correction == 'bonferroni':
+        return np.minimum(pvalues * m, 1.0)
+    if correction == 'bh':
+        order = np.argsort(pvalues, kind='stable')
+        scaled = pvalues[order] * m / np.arange(1, m + 1)
+        adjusted = np.empty(m)
+        adjusted[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+        return adjusted
+    raise ValueError(f"Unknown correction {correction!r}; expected one of {CORRECTIONS}")
+
+# Test every group's success proportion against p (default: the pooled
+# proportion over all groups) and return a table of the groups tested, most
+# significant first. keys is a Series, array or DataFrame with one row per
+# group; groups with fewer than min_trials trials are left out of the test and
+# of the correction. With significant_only, only rows with adjusted_p < alpha
+def bias_table(keys, successes, trials, p=None, alpha=ALPHA, correction='bh', min_trials=1,
+               normal_above=NORMAL_ABOVE, significant_only=False):
+    successes = np.asarray(successes, dtype=np.int64)
+    trials = np.asarray(trials, dtype=np.int64)
+    if p is None:
+        p = successes.sum() / trials.sum()
+    if not isinstance(keys, pd.DataFrame):
+        keys = pd.DataFrame({getattr(keys, 'name', None) or 'group': np.asarray(keys)})
+
+    tested = trials >= min_trials
+    table = keys[tested].reset_index(drop=True)
+    table['trials'] = trials[tested]
+    table['successes'] = successes[tested]
+    table['proportion'] = successes[tested] / trials[tested]
+    table['p_value'] = binomial_test(successes[tested], trials[tested], p, normal_above)
+    table['adjusted_p'] = adjust_pvalues(table['p_value'].to_numpy(), correction)
+    table['significant'] = table['adjusted_p'] < alpha
+    if significant_only:
+        table = table[table['significant']]
+    return table.sort_values('p_value', kind='stable').reset_index(drop=True)
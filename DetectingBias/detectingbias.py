@@ -1,237 +1,507 @@
 import pandas as pd
+import numpy as np
 import datetime
 from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import html
 import time
+import math
+import os
 import re
-import scipy.stats as stats
-
-# Initialize lists to store the data
-trip_ids = []
-vehicle_numbers = []
-arrive_times = []
-location_ids = []
-ons_list = []
-offs_list = []
-
-# Use a chunk-based approach for faster processing
-print("Processing HTML data using chunk-based parsing...")
-
-# Process the HTML file in chunks to reduce memory usage
-
-start_time = time.time()
-
-# Only parse tr elements to improve speed
-parse_only = SoupStrainer('tr')
-
-# Process the file in chunks
-row_count = 0
-chunk_size = 32768  # 32 KB chunks
-first_chunk = True  # Flag to identify the first chunk to skip header
-
-with open('trimet_stopevents_2022-12-07.html', 'r', encoding='utf-8') as file:
-    # Read the file in chunks and process each chunk
-    buffer = ""
-    
-    while True:
-        chunk = file.read(chunk_size)
-        if not chunk:
-            break
-        
-        # Add chunk to buffer
-        buffer += chunk
-        
-        # Find complete rows in the buffer
-        tr_start_indices = [m.start() for m in re.finditer(r'<tr', buffer)]
-        tr_end_indices = [m.start() + 5 for m in re.finditer(r'</tr>', buffer)]
-        
-        # Process complete rows
-        for i in range(min(len(tr_start_indices), len(tr_end_indices))):
-            if tr_start_indices[i] < tr_end_indices[i]:
-                row_html = buffer[tr_start_indices[i]:tr_end_indices[i]]
-                
-                # Skip first row (header) only on the first chunk
-                if first_chunk and i == 0:
-                    first_chunk = False
-                    continue
-                    
-                # Parse the individual row
-                row_soup = BeautifulSoup(row_html, 'html.parser', parse_only=parse_only)
-                cols = row_soup.find_all('td')
-                  # Based on the actual table structure you provided:
-                # vehicle_number, leave_time, train, route_number, direction, service_key, trip_number, stop_time,
-                # arrive_time, dwell, location_id, door, lift, ons, offs, ...
-                
-                if len(cols) >= 15:  # We need at least up to the 'offs' column (index 14)
-                    row_count += 1
-                    
-                    # Correct column mapping
-                    vehicle_num = cols[0].text.strip()
-                    trip_id = cols[6].text.strip()  # trip_number is in col 6
-                    arrive_time = cols[8].text.strip()  # arrive_time is in col 8
-                    location_id = cols[10].text.strip()  # location_id is in col 10
-                    
-                    # Add to our lists
-                    vehicle_numbers.append(vehicle_num)
-                    trip_ids.append(trip_id)
-                    arrive_times.append(arrive_time)
-                    location_ids.append(location_id)
-                    
-                    # Handle non-numeric values in ons and offs columns (cols 13 and 14)
-                    try:
-                        ons_value = float(cols[13].text.strip()) if cols[13].text.strip() else 0
-                    except ValueError:
-                        ons_value = 0  # Default to 0 if value can't be converted to float
-                    
-                    try:
-                        offs_value = float(cols[14].text.strip()) if cols[14].text.strip() else 0
-                    except ValueError:
-                        offs_value = 0  # Default to 0 if value can't be converted to float
-                        
-                    ons_list.append(ons_value)
-                    offs_list.append(offs_value)
-                    
-        # Keep only the portion of buffer that might contain incomplete rows
-        if tr_end_indices:
-            buffer = buffer[tr_end_indices[-1]:]
-
-end_time = time.time()
-print(f"\nProcessing complete. Total: {row_count} rows in {end_time-start_time:.2f} seconds ({row_count/(end_time-start_time):.2f} rows/sec)")
-print(f"Processed {len(trip_ids)} rows of data\n")
-
-# Convert arrive_time (seconds since midnight) to datetime
-# Create a function to convert seconds since midnight to a datetime object
-def seconds_to_time(seconds):
-    if not seconds or not str(seconds).isdigit():
-        return None
-    base_date = datetime.datetime.combine(datetime.datetime.today().date(), datetime.time())
-    return base_date + datetime.timedelta(seconds=int(seconds))
-# Convert arrive_times to tstamp
-start_time = time.time()
-tstamps = []
-for i, time_val in enumerate(arrive_times):
-    tstamps.append(seconds_to_time(time_val))
-
-# Create the DataFrame
-stops_df = pd.DataFrame({
-    'trip_id': trip_ids,
-    'vehicle_number': vehicle_numbers,
-    'tstamp': tstamps,
-    'location_id': location_ids,
-    'ons': ons_list,
-    'offs': offs_list
-})
-
-# Display the first few rows
-print(stops_df.head())
-
-print("\n--- Transform the Data ---")
-# Find the number of unique vehicle_ids
-unique_vehicles = stops_df['vehicle_number'].nunique()
-print(f"\nNumber of unique vehicle_numbers: {unique_vehicles}")
-# Find and print the number of unique location_ids
-unique_locations = stops_df['location_id'].nunique()
-print(f"\nNumber of unique location_ids: {unique_locations}")
-# Find and print the minimum and maximum timestamps
-# Filter out None values first to avoid comparison errors
-valid_timestamps = stops_df['tstamp'].dropna()
-if not valid_timestamps.empty:
-    min_timestamp = valid_timestamps.min()
-    max_timestamp = valid_timestamps.max()
-    print(f"\nTimestamp range:")
-    print(f"Minimum timestamp: {min_timestamp}")
-    print(f"Maximum timestamp: {max_timestamp}")
-else:
-    print("\nNo valid timestamps found in the data.")
-# Count and analyze boarding events
-boarding_events = stops_df[stops_df['ons'] >= 1]
-print(f"\nNumber of stop events with at least one passenger boarding: {len(boarding_events)} ({len(boarding_events)/len(stops_df)*100:.2f}% of total)")
-
-# Data validation slide
-print("\n--- Validate the Data for location_id 6913 ---")
-# Data validation for location ID 6913
-
-loc_6913_df = stops_df[stops_df['location_id'] == '6913']
-print(f"\nTotal stops made at location '6913': {len(loc_6913_df)}")
-analysis_df = loc_6913_df
-loc_id = '6913'
-unique_buses = analysis_df['vehicle_number'].nunique()
-# 2. How many different buses stopped at this location?
-print(f"Number of different buses that stopped at location {loc_id}: {unique_buses}")
-# 3. For what percentage of stops did at least one passenger board?
-boarding_events = analysis_df[analysis_df['ons'] >= 1]
-boarding_percentage = (len(boarding_events) / len(analysis_df) * 100)
-print(f"Stops with at least one boarding at location {loc_id}: {len(boarding_events)} ({boarding_percentage:.2f}% of stops at this location)")
-
-# Vehicle 4062 validation
-print("\n--- Validate the Data for vehicle_id 4062 ---")
-vehicle_4062_df = stops_df[stops_df['vehicle_number'] == '4062']
-# 1. How many stops made by this vehicle?
-stops_by_4062 = len(vehicle_4062_df)
-print(f"Total stops made by vehicle 4062: {stops_by_4062}")
-# 2. How many total passengers boarded this vehicle?
-total_boarding = vehicle_4062_df['ons'].sum()
-print(f"Total passengers who boarded vehicle 4062: {total_boarding:.0f}")
-# 3. How many passengers deboarded this vehicle?
-total_deboarding = vehicle_4062_df['offs'].sum()
-print(f"Total passengers who deboarded vehicle 4062: {total_deboarding:.0f}")
-# 4. For what percentage of this vehicle's stop events did at least one passenger board?
-boarding_events_4062 = vehicle_4062_df[vehicle_4062_df['ons'] >= 1]
-if stops_by_4062 > 0:
-    boarding_percentage_4062 = (len(boarding_events_4062) / stops_by_4062) * 100
-    print(f"Stops with at least one boarding for vehicle 4062: {len(boarding_events_4062)} ({boarding_percentage_4062:.2f}% of stops by this vehicle)")
-else:
-    print("No data found for vehicle 4062.")
-
-print("\n--- Detect Bias in Boarding Data using Binomial Test ---")
-
-system_stops_total = len(stops_df)
-system_stops_with_boardings = len(stops_df[stops_df['ons'] >= 1])
-system_boarding_proportion = system_stops_with_boardings / system_stops_total
-print(f"System-wide baseline: {system_stops_with_boardings} out of {system_stops_total} stops had boardings ({system_boarding_proportion:.4f} or {system_boarding_proportion*100:.2f}%)")
-unique_vehicle_numbers = stops_df['vehicle_number'].unique()
-print(f"Analyzing {len(unique_vehicle_numbers)} unique vehicles for bias...")
-alpha = 0.05
-
-biased_vehicles = []
-p_values = []
-proportions = []
-stop_counts = []
-
-# Loop through each vehicle and perform the binomial test
-for vehicle in unique_vehicle_numbers:
-    vehicle_df = stops_df[stops_df['vehicle_number'] == vehicle]
-    
-    vehicle_stops_total = len(vehicle_df)
-    vehicle_stops_with_boardings = len(vehicle_df[vehicle_df['ons'] >= 1])
-    
-    if vehicle_stops_total < 10:  # Minimum threshold for meaningful statistical analysis
-        continue
-    
-    vehicle_boarding_proportion = vehicle_stops_with_boardings / vehicle_stops_total
-    result = stats.binomtest(vehicle_stops_with_boardings, vehicle_stops_total, 
-                           system_boarding_proportion, alternative='two-sided')
-    p_value = result.pvalue
-    
-    if p_value < alpha:
-        biased_vehicles.append(vehicle)
-        p_values.append(p_value)
-        proportions.append(vehicle_boarding_proportion)
-        stop_counts.append(vehicle_stops_total)
-
-print(f"\nFound {len(biased_vehicles)} vehicles with statistically significant bias in boarding data (p < {alpha})")
-if biased_vehicles:
-    print("\nVehicles with biased boarding data (p < 5%):")
-    print("Vehicle ID | Stops | Boarding % | p-value")
-    print("-" * 50)
-    
-    # Sort by p-value (most significant first)
-    sorted_indices = sorted(range(len(p_values)), key=lambda i: p_values[i])
-    
-    for idx in sorted_indices:
-        vehicle = biased_vehicles[idx]
-        p_val = p_values[idx]
-        prop = proportions[idx]
-        stops = stop_counts[idx]
-        print(f"{vehicle:10} | {stops:5} | {prop*100:8.2f}% | {p_val:.8f}")
+from bias_testing import ALPHA, CORRECTIONS, NORMAL_ABOVE, bias_table
 
+STOP_EVENTS_FILE = 'trimet_stopevents_2022-12-07.html'
+CHUNK_SIZE = 1 << 20  # characters read at a time by the streaming parser
+RANGES_PER_WORKER = 4  # byte ranges per worker process, so uneven ranges balance out
 
+# Column positions in the stop events table:
+# vehicle_number, leave_time, train, route_number, direction, service_key, trip_number, stop_time,
+# arrive_time, dwell, location_id, door, lift, ons, offs, ...
+VEHICLE_COL = 0
+TRIP_COL = 6
+ARRIVE_COL = 8
+LOCATION_COL = 10
+ONS_COL = 13
+OFFS_COL = 14
+
+TD_PATTERN = re.compile(r'<td[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+# Text of a td the way BeautifulSoup's .text.strip() gives it
+def cell_text(cell):
+    if '<' in cell:
+        cell = TAG_PATTERN.sub('', cell)
+    if '&' in cell:
+        cell = html.unescape(cell)
+    return cell.strip()
+
+# Handle non-numeric values in ons and offs columns
+def count_value(text):
+    try:
+        return float(text) if text else 0
+    except ValueError:
+        return 0  # Default to 0 if value can't be converted to float
+
+# Streaming table extractor: reads the file chunk_size characters at a time,
+# cuts each piece after its last '</tr>' and yields the raw td contents of
+# every complete row. Only the incomplete tail is carried over to the next
+# piece, so no part of the file is scanned twice
+def iter_table_rows(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'r', encoding='utf-8') as file:
+        tail = ''
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            text = tail + chunk
+            end = text.rfind('</tr>')
+            if end < 0:
+                tail = text
+                continue
+            tail = text[end + 5:]
+            yield from table_rows(text[:end])
+
+# td contents of every complete row in a piece of the table
+def table_rows(text):
+    for row in text.split('</tr>'):
+        start = row.find('<tr')
+        if start >= 0:
+            yield TD_PATTERN.findall(row, start)
+
+# (vehicle_number, trip_id, arrive_time, location_id, ons, offs) for a stop
+# event row, or None for header rows (th cells) and short rows
+def stop_event(cols):
+    if len(cols) > OFFS_COL:  # We need at least up to the 'offs' column
+        return (cell_text(cols[VEHICLE_COL]), cell_text(cols[TRIP_COL]), cell_text(cols[ARRIVE_COL]),
+                cell_text(cols[LOCATION_COL]), count_value(cell_text(cols[ONS_COL])),
+                count_value(cell_text(cols[OFFS_COL])))
+    return None
+
+def iter_stop_events(path, chunk_size=CHUNK_SIZE):
+    for cols in iter_table_rows(path, chunk_size):
+        event = stop_event(cols)
+        if event is not None:
+            yield event
+
+# Stop event columns and their types: int32 ids, uint32 seconds since midnight
+# and uint16 passenger counts, 20 bytes a stop event
+STOP_DTYPES = {
+    'vehicle_number': np.int32,
+    'trip_id': np.int32,
+    'arrive_time': np.uint32,
+    'location_id': np.int32,
+    'ons': np.uint16,
+    'offs': np.uint16,
+}
+STOP_COLUMNS = list(STOP_DTYPES)
+MISSING_ID = -1                                # id that was not a number
+MISSING_TIME = np.iinfo(np.uint32).max         # arrive_time that was not a number of seconds
+INITIAL_CAPACITY = 1 << 16                     # stop events StopEvents has room for up front
+ROW_BLOCK = 1 << 16                            # parsed rows converted to typed columns at a time
+
+# Typed columns for a block of (vehicle_number, trip_id, arrive_time,
+# location_id, ons, offs) tuples as iter_stop_events yields them
+def stop_columns(rows):
+    cols = list(zip(*rows)) if rows else [()] * len(STOP_COLUMNS)
+    columns = {}
+    for name, col in zip(STOP_COLUMNS[:4], cols[:4]):
+        values = pd.to_numeric(pd.Series(col, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        if name == 'arrive_time':
+            valid = (values >= 0) & (values == np.floor(values))
+            columns[name] = np.where(valid, values, MISSING_TIME).astype(np.uint32)
+        else:
+            columns[name] = np.nan_to_num(values, nan=MISSING_ID).astype(np.int32)
+    for name, col in zip(STOP_COLUMNS[4:], cols[4:]):
+        columns[name] = np.clip(np.array(col, dtype=np.float64), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+    return columns
+
+# Stop events kept in preallocated typed arrays that double in size as blocks
+# of rows are appended. tstamp is only worked out when it is asked for
+class StopEvents:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.data = {name: np.empty(capacity, dtype=dtype) for name, dtype in STOP_DTYPES.items()}
+        self._tstamp = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        events = cls(len(rows))
+        events.extend(rows)
+        return events
+
+    @classmethod
+    def concat(cls, parts):
+        events = cls(sum(len(part) for part in parts))
+        for part in parts:
+            events.extend_columns({name: part[name] for name in STOP_COLUMNS})
+        return events
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.data[name][:self.size]
+
+    @property
+    def nbytes(self):
+        return sum(self[name].nbytes for name in STOP_COLUMNS)
+
+    # make room for `extra` more stop events, doubling the capacity as needed
+    def reserve(self, extra):
+        capacity = len(self.data['trip_id'])
+        if self.size + extra <= capacity:
+            return
+        capacity = max(capacity, 1)
+        while capacity < self.size + extra:
+            capacity *= 2
+        for name, column in self.data.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.data[name] = grown
+
+    def extend_columns(self, columns):
+        count = len(columns['trip_id'])
+        self.reserve(count)
+        for name in STOP_COLUMNS:
+            self.data[name][self.size:self.size + count] = columns[name]
+        self.size += count
+        self._tstamp = None
+
+    def extend(self, rows):
+        self.extend_columns(stop_columns(rows))
+
+    # drop the unused capacity, e.g. before sending the arrays to another process
+    def trim(self):
+        self.data = {name: self[name].copy() for name in STOP_COLUMNS}
+        return self
+
+    # arrive_time as datetime64 on today's date, NaT where it is missing
+    @property
+    def tstamp(self):
+        if self._tstamp is None:
+            self._tstamp = arrive_timestamps(self['arrive_time'])
+        return self._tstamp
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'trip_id': self['trip_id'],
+            'vehicle_number': self['vehicle_number'],
+            'tstamp': self.tstamp,
+            'location_id': self['location_id'],
+            'ons': self['ons'],
+            'offs': self['offs'],
+        })
+
+# Convert arrive_time (seconds since midnight) to datetime64 on today's date
+def arrive_timestamps(seconds):
+    base_date = np.datetime64(datetime.date.today(), 's')
+    tstamps = base_date + seconds.astype('timedelta64[s]')
+    tstamps[seconds == MISSING_TIME] = np.datetime64('NaT')
+    return tstamps
+
+def read_stop_events(path):
+    events = StopEvents()
+    block = []
+    for event in iter_stop_events(path):
+        block.append(event)
+        if len(block) >= ROW_BLOCK:
+            events.extend(block)
+            block = []
+    events.extend(block)
+    return events
+
+# Split a file into about `parts` byte ranges that each start at a '<tr', so
+# every row falls entirely inside one range
+def byte_ranges(path, parts):
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as file:
+        for k in range(1, parts):
+            pos = max(size * k // parts, bounds[-1])
+            file.seek(pos)
+            carry = b''
+            while True:
+                block = file.read(CHUNK_SIZE)
+                if not block:
+                    pos = size
+                    break
+                found = (carry + block).find(b'<tr')
+                if found >= 0:
+                    pos += found - len(carry)
+                    break
+                pos += len(block)
+                carry = block[-2:]  # a '<tr' may straddle two blocks
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return [(path, start, end) for start, end in zip(bounds, bounds[1:])]
+
+# Runs in a worker process: parse one byte range into compact column arrays
+def parse_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    events = (stop_event(cols) for cols in table_rows(text))
+    return StopEvents.from_rows([event for event in events if event is not None]).trim()
+
+# Parse one or more stop events files into StopEvents.
+# With workers > 1 the files are cut into byte ranges on row boundaries and
+# parsed on a process pool; the ranges come back in file order
+def parse_stop_events(paths=STOP_EVENTS_FILE, workers=1):
+    if isinstance(paths, str):
+        paths = [paths]
+    start_time = time.time()
+    if workers > 1:
+        total = sum(os.path.getsize(path) for path in paths)
+        target = max(total / (workers * RANGES_PER_WORKER), 1)
+        ranges = [r for path in paths for r in byte_ranges(path, math.ceil(os.path.getsize(path) / target))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(parse_range, *zip(*ranges))) if ranges else []
+    else:
+        parts = [read_stop_events(path) for path in paths]
+    events = parts[0] if len(parts) == 1 else StopEvents.concat(parts)
+    end_time = time.time()
+    row_count = len(events)
+    print(f"\nProcessing complete. Total: {row_count} rows in {end_time-start_time:.2f} seconds ({row_count/(end_time-start_time):.2f} rows/sec)")
+    return events
+
+# The original parser, kept as the reference for --benchmark: it builds a
+# BeautifulSoup object for every row
+def parse_stop_events_soup(path=STOP_EVENTS_FILE):
+    vehicle_numbers = []
+    trip_ids = []
+    arrive_times = []
+    location_ids = []
+    ons_list = []
+    offs_list = []
+
+    start_time = time.time()
+
+    # Only parse tr elements to improve speed
+    parse_only = SoupStrainer('tr')
+
+    # Process the file in chunks
+    row_count = 0
+    chunk_size = 32768  # 32 KB chunks
+    first_chunk = True  # Flag to identify the first chunk to skip header
+
+    with open(path, 'r', encoding='utf-8') as file:
+        # Read the file in chunks and process each chunk
+        buffer = ""
+
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+
+            # Add chunk to buffer
+            buffer += chunk
+
+            # Find complete rows in the buffer
+            tr_start_indices = [m.start() for m in re.finditer(r'<tr', buffer)]
+            tr_end_indices = [m.start() + 5 for m in re.finditer(r'</tr>', buffer)]
+
+            # Process complete rows
+            for i in range(min(len(tr_start_indices), len(tr_end_indices))):
+                if tr_start_indices[i] < tr_end_indices[i]:
+                    row_html = buffer[tr_start_indices[i]:tr_end_indices[i]]
+
+                    # Skip first row (header) only on the first chunk
+                    if first_chunk and i == 0:
+                        first_chunk = False
+                        continue
+
+                    # Parse the individual row
+                    row_soup = BeautifulSoup(row_html, 'html.parser', parse_only=parse_only)
+                    cols = row_soup.find_all('td')
+
+                    if len(cols) > OFFS_COL:
+                        row_count += 1
+                        vehicle_numbers.append(cols[VEHICLE_COL].text.strip())
+                        trip_ids.append(cols[TRIP_COL].text.strip())
+                        arrive_times.append(cols[ARRIVE_COL].text.strip())
+                        location_ids.append(cols[LOCATION_COL].text.strip())
+                        ons_list.append(count_value(cols[ONS_COL].text.strip()))
+                        offs_list.append(count_value(cols[OFFS_COL].text.strip()))
+
+            # Keep only the portion of buffer that might contain incomplete rows
+            if tr_end_indices:
+                buffer = buffer[tr_end_indices[-1]:]
+
+    end_time = time.time()
+    print(f"\nProcessing complete. Total: {row_count} rows in {end_time-start_time:.2f} seconds ({row_count/(end_time-start_time):.2f} rows/sec)")
+    return [vehicle_numbers, trip_ids, arrive_times, location_ids, ons_list, offs_list]
+
+# Time both parsers on the same file and check they produce the same rows
+def benchmark(path=STOP_EVENTS_FILE):
+    print("--- BeautifulSoup parser ---")
+    start = time.perf_counter()
+    reference = parse_stop_events_soup(path)
+    soup_seconds = time.perf_counter() - start
+    reference = StopEvents.from_rows(list(zip(*reference)))
+    print("--- Streaming parser ---")
+    start = time.perf_counter()
+    events = parse_stop_events(path)
+    stream_seconds = time.perf_counter() - start
+    same = all(np.array_equal(events[name], reference[name]) for name in STOP_COLUMNS)
+    print(f"\nSpeedup: {soup_seconds / stream_seconds:.1f}x, same rows: {same}")
+
+# Kinds of groups the bias detector can test, with how to name them in the report
+BIAS_GROUPS = {
+    'vehicle_number': ('vehicles', 'Vehicle ID'),
+    'location_id': ('locations', 'Location ID'),
+    'trip_id': ('trips', 'Trip ID'),
+}
+MIN_STOPS = 10  # Minimum threshold for meaningful statistical analysis
+
+# Stops and stops with at least one boarding for every value of `by` (a
+# column or a list of columns, e.g. ['vehicle_number', 'location_id']), in
+# order of first appearance, from one grouping and two bincount passes.
+# Returns a DataFrame of group keys and the two count arrays
+def boarding_counts(stops_df, by='vehicle_number'):
+    if isinstance(by, str):
+        codes, uniques = pd.factorize(stops_df[by])
+        keys = pd.DataFrame({by: uniques})
+    else:
+        grouped = stops_df.groupby(list(by), sort=False)
+        codes = grouped.ngroup().to_numpy()
+        keys = grouped.size().index.to_frame(index=False)
+    boarded = (stops_df['ons'].to_numpy() >= 1)
+    stops = np.bincount(codes, minlength=len(keys))
+    boardings = np.bincount(codes, weights=boarded, minlength=len(keys)).astype(np.int64)
+    return keys, stops, boardings
+
+# Binomial test of every group's share of stops with boardings against the
+# system-wide share, corrected for the number of groups tested. Returns the
+# groups whose adjusted p-value is below alpha, most significant first
+def detect_bias(stops_df, by='vehicle_number', alpha=ALPHA, correction='bh', min_stops=MIN_STOPS,
+                normal_above=NORMAL_ABOVE):
+    keys, stops, boardings = boarding_counts(stops_df, by)
+    table = bias_table(keys, boardings, stops, alpha=alpha, correction=correction, min_trials=min_stops,
+                       normal_above=normal_above, significant_only=True)
+    return table.rename(columns={'trials': 'stops', 'successes': 'boardings'})
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse TriMet stop events and look for bias in boarding data")
+    parser.add_argument("paths", nargs="*", default=[STOP_EVENTS_FILE], help="stop events HTML files")
+    parser.add_argument("--workers", type=int, default=1, help="parse byte ranges of the files on this many processes")
+    parser.add_argument("--benchmark", action="store_true", help="compare the streaming and BeautifulSoup parsers")
+    parser.add_argument("--group-by", nargs="+", choices=list(BIAS_GROUPS), default=["vehicle_number"],
+                        help="test each vehicle, stop location or trip (or combination) for bias")
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--correction", choices=CORRECTIONS, default="bh",
+                        help="multiple-testing correction: Benjamini-Hochberg, Bonferroni or none")
+    parser.add_argument("--normal-above", type=int, default=NORMAL_ABOVE,
+                        help="use the normal approximation for groups with more stops than this")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.paths[0])
+        return
+
+    print("Processing HTML data using streaming table parsing...")
+    events = parse_stop_events(args.paths, args.workers)
+    print(f"Processed {len(events)} rows of data "
+          f"({events.nbytes / 1e6:.1f} MB, {events.nbytes / max(len(events), 1):.0f} bytes per stop event)\n")
+
+    # Create the DataFrame; tstamp is computed from arrive_time in one vectorized step
+    stops_df = events.to_frame()
+
+    # Display the first few rows
+    print(stops_df.head())
+
+    print("\n--- Transform the Data ---")
+    # Find the number of unique vehicle_ids
+    unique_vehicles = stops_df['vehicle_number'].nunique()
+    print(f"\nNumber of unique vehicle_numbers: {unique_vehicles}")
+    # Find and print the number of unique location_ids
+    unique_locations = stops_df['location_id'].nunique()
+    print(f"\nNumber of unique location_ids: {unique_locations}")
+    # Find and print the minimum and maximum timestamps
+    # Filter out None values first to avoid comparison errors
+    valid_timestamps = stops_df['tstamp'].dropna()
+    if not valid_timestamps.empty:
+        min_timestamp = valid_timestamps.min()
+        max_timestamp = valid_timestamps.max()
+        print(f"\nTimestamp range:")
+        print(f"Minimum timestamp: {min_timestamp}")
+        print(f"Maximum timestamp: {max_timestamp}")
+    else:
+        print("\nNo valid timestamps found in the data.")
+    # Count and analyze boarding events
+    boarding_events = stops_df[stops_df['ons'] >= 1]
+    print(f"\nNumber of stop events with at least one passenger boarding: {len(boarding_events)} ({len(boarding_events)/len(stops_df)*100:.2f}% of total)")
+
+    # Data validation slide
+    print("\n--- Validate the Data for location_id 6913 ---")
+    # Data validation for location ID 6913
+
+    loc_6913_df = stops_df[stops_df['location_id'] == 6913]
+    print(f"\nTotal stops made at location '6913': {len(loc_6913_df)}")
+    analysis_df = loc_6913_df
+    loc_id = 6913
+    unique_buses = analysis_df['vehicle_number'].nunique()
+    # 2. How many different buses stopped at this location?
+    print(f"Number of different buses that stopped at location {loc_id}: {unique_buses}")
+    # 3. For what percentage of stops did at least one passenger board?
+    boarding_events = analysis_df[analysis_df['ons'] >= 1]
+    boarding_percentage = (len(boarding_events) / len(analysis_df) * 100)
+    print(f"Stops with at least one boarding at location {loc_id}: {len(boarding_events)} ({boarding_percentage:.2f}% of stops at this location)")
+
+    # Vehicle 4062 validation
+    print("\n--- Validate the Data for vehicle_id 4062 ---")
+    vehicle_4062_df = stops_df[stops_df['vehicle_number'] == 4062]
+    # 1. How many stops made by this vehicle?
+    stops_by_4062 = len(vehicle_4062_df)
+    print(f"Total stops made by vehicle 4062: {stops_by_4062}")
+    # 2. How many total passengers boarded this vehicle?
+    total_boarding = vehicle_4062_df['ons'].sum()
+    print(f"Total passengers who boarded vehicle 4062: {total_boarding:.0f}")
+    # 3. How many passengers deboarded this vehicle?
+    total_deboarding = vehicle_4062_df['offs'].sum()
+    print(f"Total passengers who deboarded vehicle 4062: {total_deboarding:.0f}")
+    # 4. For what percentage of this vehicle's stop events did at least one passenger board?
+    boarding_events_4062 = vehicle_4062_df[vehicle_4062_df['ons'] >= 1]
+    if stops_by_4062 > 0:
+        boarding_percentage_4062 = (len(boarding_events_4062) / stops_by_4062) * 100
+        print(f"Stops with at least one boarding for vehicle 4062: {len(boarding_events_4062)} ({boarding_percentage_4062:.2f}% of stops by this vehicle)")
+    else:
+        print("No data found for vehicle 4062.")
+
+    print("\n--- Detect Bias in Boarding Data using Binomial Test ---")
+
+    system_stops_total = len(stops_df)
+    system_stops_with_boardings = len(stops_df[stops_df['ons'] >= 1])
+    system_boarding_proportion = system_stops_with_boardings / system_stops_total
+    print(f"System-wide baseline: {system_stops_with_boardings} out of {system_stops_total} stops had boardings ({system_boarding_proportion:.4f} or {system_boarding_proportion*100:.2f}%)")
+    by = args.group_by[0] if len(args.group_by) == 1 else args.group_by
+    columns = [by] if isinstance(by, str) else by
+    if isinstance(by, str):
+        groups, label = BIAS_GROUPS[by]
+    else:
+        groups = "(" + ", ".join(BIAS_GROUPS[col][0] for col in by) + ") groups"
+        label = " / ".join(BIAS_GROUPS[col][1] for col in by)
+    print(f"Analyzing {len(stops_df[columns].drop_duplicates())} unique {groups} for bias...")
+    alpha = args.alpha
+
+    start_time = time.time()
+    biased = detect_bias(stops_df, by, alpha, args.correction, normal_above=args.normal_above)
+    print(f"Tested {groups} in {time.time() - start_time:.2f} seconds")
+
+    correction = "" if args.correction == "none" else f", {args.correction} corrected"
+    print(f"\nFound {len(biased)} {groups} with statistically significant bias in boarding data (p < {alpha}{correction})")
+    if len(biased):
+        keys = biased[columns].astype(str).agg("/".join, axis=1)
+        width = max(len(label), 10, keys.str.len().max())
+        print(f"\n{groups[0].upper() + groups[1:]} with biased boarding data (p < {alpha * 100:g}%{correction}):")
+        print(f"{label:<{width}} | Stops | Boarding % | p-value    | adjusted p")
+        print("-" * (width + 53))
+
+        for key, stops, prop, p_val, adj_p in zip(keys, biased['stops'], biased['proportion'],
+                                                  biased['p_value'], biased['adjusted_p']):
+            print(f"{key:<{width}} | {stops:5} | {prop*100:8.2f}% | {p_val:.8f} | {adj_p:.8f}")
+
+if __name__ == "__main__":
+    main()
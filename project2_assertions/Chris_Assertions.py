@@ -1,14 +1,40 @@
 import json
-import sys
-from collections import defaultdict
+import argparse
+import numpy as np
+import pandas as pd
 import datetime
+import time
+import glob
+import os
+import hashlib
+import pickle
+import sqlite3
+from array import array
+
+# Load breadcrumb records from a JSON file, or from a Parquet file/dataset
+# written by DataTransformation/data_transport.py. For Parquet only the listed
+# columns are read and filters are pushed down to skip partitions, e.g.
+# filters=[("VEHICLE_ID", "=", 2901)]; TIMESTAMP is returned as the
+# DD:MM:YYYY:HH:MM:SS 'timestamp' field the JSON records carry
+def load_records(path, columns=None, filters=None):
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        parquet_columns = None
+        if columns is not None:
+            parquet_columns = ['TIMESTAMP' if col == 'timestamp' else col for col in columns]
+        df = pq.read_table(path, columns=parquet_columns, filters=filters).to_pandas()
+        if 'TIMESTAMP' in df:
+            df['timestamp'] = df.pop('TIMESTAMP').dt.strftime('%d:%m:%Y:%H:%M:%S')
+        return df.to_dict('records')
+
+    with open(path, 'r') as file:
+        data = json.load(file)
+    return data if isinstance(data, list) else [data]
 
 def verify_vehicle_ids(json_file_path):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-        
-        records = data if isinstance(data, list) else [data]
+        records = load_records(json_file_path, columns=['VEHICLE_ID'])
         
         invalid_ids = []
         
@@ -50,10 +76,7 @@ def verify_vehicle_ids(json_file_path):
 
 def verify_timestamp_format(json_file_path):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-        
-        records = data if isinstance(data, list) else [data]
+        records = load_records(json_file_path, columns=['timestamp'])
         
         invalid_times = []
         
@@ -105,10 +128,7 @@ def verify_timestamp_format(json_file_path):
 
 def verify_coordinates_within_portland(json_file_path):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-        
-        records = data if isinstance(data, list) else [data]
+        records = load_records(json_file_path, columns=['GPS_LATITUDE', 'GPS_LONGITUDE'])
         
         invalid_coordinates = []
         
@@ -174,72 +194,131 @@ def parse_timestamp(time_str):
         return datetime.datetime(year, month, day, hour, minute, second)
     raise ValueError(f"Invalid time format: {time_str}")
 
-def verify_meters_increase_with_time(json_file_path):
+# Integer sort keys for the meters check: vehicle id, OPD date as days since
+# the epoch and the breadcrumb timestamp as seconds since the epoch, plus
+# meters as floats. Rows missing a field or holding a value that does not
+# parse are dropped. Returns (vehicle, date, seconds, meters, dates, dropped)
+# where dates maps each date back to the OPD_DATE text for reports
+def meters_arrays(frame):
+    n = len(frame)
+    if 'OPD_DATE' not in frame or not {'timestamp', 'TIMESTAMP'} & set(frame):
+        frame = pd.DataFrame({'OPD_DATE': [None] * n, 'TIMESTAMP': pd.NaT}, index=frame.index)
+
+    vehicle = numeric_column(frame, 'VEHICLE_ID')
+    meters = numeric_column(frame, 'METERS')
+
+    # OPD_DATE only takes a few distinct values, so parse each one once. The
+    # API sends 06DEC2022:00:00:00; the Parquet datasets store 2022-12-06
+    codes, uniques = pd.factorize(frame['OPD_DATE'])
+    texts = pd.Index(np.asarray(uniques).astype(str))
+    days = pd.to_datetime(texts, format='%d%b%Y:%H:%M:%S', errors='coerce')
+    iso = pd.to_datetime(texts, format='%Y-%m-%d', errors='coerce')
+    days = days.where(days.notna(), iso)
+    date = days.take(codes, allow_fill=True, fill_value=pd.NaT)
+    dates = {int(day): str(text) for day, text in zip(days.to_numpy(dtype='datetime64[D]').astype(np.int64), uniques)}
+
+    if 'TIMESTAMP' in frame:
+        parsed = frame['TIMESTAMP'].notna().to_numpy()
+        seconds = frame['TIMESTAMP'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    else:
+        seconds, parsed = timestamp_seconds(frame['timestamp'].to_numpy())
+
+    valid = ~np.isnan(vehicle) & ~np.isnan(meters) & date.notna() & parsed
+    return (vehicle[valid].astype(np.int32),
+            date[valid].to_numpy(dtype='datetime64[D]').astype(np.int32),
+            seconds[valid], meters[valid], dates, int(n - valid.sum()))
+
+# DD:MM:YYYY:HH:MM:SS strings to seconds since the epoch, and a mask of the
+# ones that parsed. Canonical rows are converted arithmetically; strptime is
+# only used for the rest, which is much slower
+def timestamp_seconds(values):
+    canonical, (day, month, year, hour, minute, second) = timestamp_fields(values)
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months + (day - 1).astype('timedelta64[D]')
+    parsed = (canonical & (month >= 1) & (month <= 12) & (day >= 1) &
+              (days.astype('datetime64[M]') == months) &
+              (hour <= 23) & (minute <= 59) & (second <= 59))
+    seconds = days.astype(np.int64) * 86400 + hour * 3600 + minute * 60 + second
+
+    others = np.flatnonzero(~canonical)
+    if len(others):
+        timestamp = pd.to_datetime(pd.Series(values[others], dtype=object),
+                                   format='%d:%m:%Y:%H:%M:%S', errors='coerce')
+        parsed[others] = timestamp.notna().to_numpy()
+        seconds[others] = timestamp.to_numpy(dtype='datetime64[s]').astype(np.int64)
+    return seconds, parsed
+
+# Sort every breadcrumb by (vehicle, date, seconds) with one lexsort and compare
+# each with the one before it. Returns the (previous, current) input indexes of
+# each pair where time increased but meters decreased, in sorted order
+def meters_violations(vehicle, date, seconds, meters):
+    order = np.lexsort((seconds, date, vehicle))
+    v, d, s, m = vehicle[order], date[order], seconds[order], meters[order]
+    bad = (v[1:] == v[:-1]) & (d[1:] == d[:-1]) & (s[1:] > s[:-1]) & (m[1:] < m[:-1])
+    i = np.flatnonzero(bad)
+    return order[i], order[i + 1]
+
+# Same as meters_violations, with vehicles split across a process pool
+def meters_violations_parallel(vehicle, date, seconds, meters, workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = [np.flatnonzero(vehicle % workers == k) for k in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(meters_violations, vehicle[i], date[i], seconds[i], meters[i]) for i in shards]
+        pairs = [(i[prev], i[curr]) for i, future in zip(shards, futures) for prev, curr in [future.result()]]
+    prev = np.concatenate([p for p, c in pairs])
+    curr = np.concatenate([c for p, c in pairs])
+    order = np.lexsort((seconds[curr], date[curr], vehicle[curr]))
+    return prev[order], curr[order]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# OPD_DATE in either form meters_arrays accepts, or None if it is neither
+def parse_opd_date(text):
+    for fmt in ('%d%b%Y:%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+def format_seconds(seconds):
+    return np.datetime64(int(seconds), 's').astype(datetime.datetime).strftime('%d:%m:%Y:%H:%M:%S')
+
+def meters_anomaly(vehicle, opd_date, prev_seconds, prev_meters, curr_seconds, curr_meters):
+    return (f"Vehicle {vehicle} on {opd_date}: "
+            f"At time {format_seconds(prev_seconds)}: {prev_meters}m → "
+            f"At time {format_seconds(curr_seconds)}: {curr_meters}m")
+
+def verify_meters_increase_with_time(json_file_path, workers=1):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-        
-        records = data if isinstance(data, list) else [data]
-        
-        # Group records by vehicle_id and date
-        vehicle_records = defaultdict(list)
-        for record in records:
-            if ('VEHICLE_ID' not in record or 'OPD_DATE' not in record or 
-                'timestamp' not in record or 'METERS' not in record):
-                continue
-                
-            vehicle_id = record['VEHICLE_ID']
-            opd_date = record['OPD_DATE']
-            key = f"{vehicle_id}_{opd_date}"
-            
-            # Extract the relevant fields
-            try:
-                # Parse the timestamp in DD:MM:YYYY:HH:MM:SS format
-                timestamp = parse_timestamp(record['timestamp'])
-                meters = float(record['METERS'])
-                vehicle_records[key].append((timestamp, meters))
-            except (ValueError, TypeError, AttributeError) as e:
-                print(f"Error parsing record: {e}")
-                continue
-        
+        records = load_records(json_file_path, columns=['VEHICLE_ID', 'OPD_DATE', 'timestamp', 'METERS'])
+        vehicle, date, seconds, meters, dates, dropped = meters_arrays(pd.DataFrame.from_records(records))
+        if dropped:
+            print(f"Skipped {dropped} records with missing or unparsable fields")
+        if dropped and not len(vehicle):
+            print("Error: No records could be checked for increasing meters")
+            return False
+
         # Check if meters increase with time for each vehicle on each day
-        anomalies = []
-        
-        for key, time_meter_pairs in vehicle_records.items():
-            # Sort by timestamp to ensure chronological order
-            time_meter_pairs.sort(key=lambda x: x[0])
-            
-            vehicle_id, opd_date = key.split('_', 1)
-            
-            for i in range(1, len(time_meter_pairs)):
-                prev_time, prev_meters = time_meter_pairs[i-1]
-                curr_time, curr_meters = time_meter_pairs[i]
-                
-                # If time increases but meters don't increase or decrease
-                if curr_time > prev_time and curr_meters < prev_meters:
-                    anomalies.append({
-                        'vehicle_id': vehicle_id,
-                        'opd_date': opd_date,
-                        'prev_time': prev_time.strftime('%d:%m:%Y:%H:%M:%S'),
-                        'prev_meters': prev_meters,
-                        'curr_time': curr_time.strftime('%d:%m:%Y:%H:%M:%S'),
-                        'curr_meters': curr_meters
-                    })
-        
-        if anomalies:
-            print(f"Error: Found {len(anomalies)} instances where meters decreased as time increased:")
-            for i, anomaly in enumerate(anomalies[:10]):
-                print(f"  {i+1}. Vehicle {anomaly['vehicle_id']} on {anomaly['opd_date']}: " +
-                      f"At time {anomaly['prev_time']}: {anomaly['prev_meters']}m → " +
-                      f"At time {anomaly['curr_time']}: {anomaly['curr_meters']}m")
-            
-            if len(anomalies) > 10:
-                print(f"... and {len(anomalies) - 10} more anomalies.")
+        if workers > 1:
+            prev, curr = meters_violations_parallel(vehicle, date, seconds, meters, workers)
+        else:
+            prev, curr = meters_violations(vehicle, date, seconds, meters)
+
+        if len(curr):
+            print(f"Error: Found {len(curr)} instances where meters decreased as time increased:")
+            for i, (p, c) in enumerate(zip(prev[:10], curr[:10])):
+                print(f"  {i+1}. " + meters_anomaly(vehicle[c], dates[date[c]], seconds[p], meters[p],
+                                                     seconds[c], meters[c]))
+
+            if len(curr) > 10:
+                print(f"... and {len(curr) - 10} more anomalies.")
             return False
         else:
             print("Success: All vehicles' meters increase consistently with time.")
             return True
-            
+
     except FileNotFoundError:
         print(f"Error: File not found: {json_file_path}")
         return False
@@ -250,12 +329,845 @@ def verify_meters_increase_with_time(json_file_path):
         print(f"Error: An unexpected error occurred: {e}")
         return False
 
+##################################
+# Single-pass assertion engine
+#
+# The verify_* functions above each parse the whole file. The engine below
+# parses it once, streaming records in batches through every registered
+# assertion, and keeps only counts, a few sample violations and per-group
+# state in memory, so file size is not limited by RAM.
+
+BATCH_SIZE = 10000    # records handed to each assertion at a time
+MAX_SAMPLES = 10      # violations kept per assertion for the report
+READ_SIZE = 1 << 20   # characters read from the file at a time
+MAX_RECORD_SIZE = 64 * READ_SIZE  # a record that still does not parse past this many characters is corrupt
+
+# Yield records one at a time from a JSON array, a single JSON object or
+# newline-delimited JSON, reading the file in READ_SIZE pieces
+def iter_json_records(path):
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\r\n'
+    with open(path, 'r') as file:
+        buf = file.read(READ_SIZE)
+        pos = 0
+        eof = not buf
+        while True:
+            # skip separators between records; '[' and ']' only delimit the array
+            while pos < len(buf) and buf[pos] in whitespace + ',[]':
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                buf = file.read(READ_SIZE)
+                pos = 0
+                eof = not buf
+                continue
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # give up instead of buffering the rest of the file behind a bad record
+                if eof or len(buf) - pos > MAX_RECORD_SIZE:
+                    raise
+                # the record continues past what has been read so far
+                more = file.read(READ_SIZE)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield record
+            pos = end
+            if pos > READ_SIZE:
+                buf = buf[pos:]
+                pos = 0
+
+# A batch of records that assertions can read either as a list of dicts (the
+# per-record Python assertions) or as a DataFrame (the vectorized ones); each
+# form is built at most once, on first use
+class Batch:
+    def __init__(self, records=None, frame=None):
+        self._records = records
+        self._frame = frame
+
+    @property
+    def records(self):
+        if self._records is None:
+            frame = self._frame
+            if 'TIMESTAMP' in frame:
+                # Parquet keeps real timestamps; records carry the JSON string form
+                frame = frame.assign(timestamp=frame['TIMESTAMP'].dt.strftime('%d:%m:%Y:%H:%M:%S'))
+                frame = frame.drop(columns='TIMESTAMP')
+            self._records = frame.to_dict('records')
+        return self._records
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self._frame = pd.DataFrame.from_records(self._records)
+        return self._frame
+
+    def __len__(self):
+        return len(self._records) if self._records is not None else len(self._frame)
+
+    # mask of the rows that do not have all of the given fields. A frame column
+    # holds NaN both for a JSON null and for a key the record left out, so only
+    # the records can tell the two apart
+    def missing(self, *names):
+        frame = self.frame
+        if any(name not in frame for name in names):
+            return np.ones(len(frame), dtype=bool)
+        absent = np.zeros(len(frame), dtype=bool)
+        if self._records is not None:
+            nulls = np.flatnonzero(frame[list(names)].isna().any(axis=1).to_numpy())
+            absent[nulls] = [any(name not in self._records[i] for name in names) for i in nulls]
+        return absent
+
+# Parquet files and datasets are read straight into columns. With fields, only
+# those columns are decoded (TIMESTAMP for 'timestamp'). A partitioned dataset
+# yields one small record batch per file, so those are coalesced up to
+# BATCH_SIZE rows before converting; otherwise per-batch overhead dominates
+def iter_parquet_batches(path, fields=None):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    columns = None
+    if fields is not None:
+        wanted = {'TIMESTAMP' if field == 'timestamp' else field for field in fields}
+        columns = [name for name in dataset.schema.names if name in wanted]
+    pending = []
+    rows = 0
+    for batch in dataset.to_batches(columns=columns, batch_size=BATCH_SIZE):
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= BATCH_SIZE:
+            yield Batch(frame=pa.Table.from_batches(pending).to_pandas())
+            pending = []
+            rows = 0
+    if pending:
+        yield Batch(frame=pa.Table.from_batches(pending).to_pandas())
+
+def iter_json_batches(path):
+    records = []
+    for record in iter_json_records(path):
+        records.append(record)
+        if len(records) >= BATCH_SIZE:
+            yield Batch(records=records)
+            records = []
+    if records:
+        yield Batch(records=records)
+
+# fields limits the columns read from Parquet; JSON records are always parsed whole
+def iter_batches(path, fields=None):
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        return iter_parquet_batches(path, fields)
+    return iter_json_batches(path)
+
+# every record field the given assertions read
+def assertion_fields(assertions):
+    return set().union(*(assertion.fields for assertion in assertions))
+
+# Base class: subclasses look at each record in check() and call violation()
+# for every problem; only the count and the first MAX_SAMPLES are kept
+class Assertion:
+    name = 'assertion'
+    version = 1           # bump when the rule changes, so cached results are not reused
+    fields = ()           # record fields the assertion reads; Parquet reads only these columns
+    success_message = ''
+    failure_message = ''
+
+    def __init__(self):
+        self.violations = 0
+        self.samples = []
+        self.fatal = None      # set for problems that fail the assertion outright
+        self.seconds = 0.0
+
+    def violation(self, sample):
+        self.violations += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(sample)
+
+    def check_batch(self, batch):
+        for record in batch.records:
+            self.check(record)
+
+    def check(self, record):
+        raise NotImplementedError
+
+    # called once after the last batch, for assertions that look at the whole file
+    def finish(self):
+        pass
+
+    # fold in the results of the same assertion run over another file
+    def merge(self, other):
+        self.violations += other.violations
+        self.samples.extend(other.samples[:MAX_SAMPLES - len(self.samples)])
+        if self.fatal is None:
+            self.fatal = other.fatal
+        self.seconds += other.seconds
+
+    def passed(self):
+        return self.fatal is None and self.violations == 0
+
+    def report(self):
+        if self.fatal is not None:
+            print(self.fatal)
+        elif self.violations:
+            print(f"Error: Found {self.violations} {self.failure_message}: {self.samples}")
+            if self.violations > MAX_SAMPLES:
+                print(f"... and {self.violations - MAX_SAMPLES} more.")
+        else:
+            print(f"Success: {self.success_message}")
+        print(f"  ({self.name}: {self.seconds:.3f} seconds)")
+
+class VehicleIdAssertion(Assertion):
+    name = 'vehicle_ids'
+    fields = ('VEHICLE_ID',)
+    success_message = "All vehicle IDs are positive and within the range of 2901 to 99222."
+    failure_message = "invalid vehicle IDs"
+
+    def check(self, record):
+        if 'VEHICLE_ID' not in record:
+            if self.fatal is None:
+                self.fatal = f"Error: Record missing VEHICLE_ID field: {record}"
+            return
+        vehicle_id = record['VEHICLE_ID']
+        if not isinstance(vehicle_id, (int, float)):
+            try:
+                vehicle_id = int(vehicle_id)
+            except (ValueError, TypeError):
+                self.violation(f"Non-numeric ID: {vehicle_id}")
+                return
+        if vehicle_id < 2901 or vehicle_id > 99222:
+            self.violation(vehicle_id)
+
+class TimestampFormatAssertion(Assertion):
+    name = 'timestamp_format'
+    fields = ('timestamp',)
+    success_message = "All timestamp values are in valid DD:MM:YYYY:HH:MM:SS format."
+    failure_message = "invalid timestamp values"
+
+    def check(self, record):
+        if 'timestamp' not in record:
+            if self.fatal is None:
+                self.fatal = f"Error: Record missing timestamp field: {record}"
+            return
+        problem = timestamp_problem(record['timestamp'])
+        if problem is not None:
+            self.violation(problem)
+
+# None if timestamp is a valid DD:MM:YYYY:HH:MM:SS string, else the violation to report
+def timestamp_problem(timestamp):
+    try:
+        time_parts = timestamp.split(':')
+        if len(time_parts) == 6:
+            day, month, year, hour, minute, second = map(int, time_parts)
+            if (hour < 0 or hour > 23 or
+                minute < 0 or minute > 59 or
+                second < 0 or second > 59):
+                return timestamp
+            return None
+        return timestamp
+    except (ValueError, AttributeError, TypeError):
+        return f"Invalid time format: {timestamp}"
+
+class PortlandCoordinatesAssertion(Assertion):
+    name = 'coordinates_within_portland'
+    version = 2
+    fields = ('GPS_LATITUDE', 'GPS_LONGITUDE')
+    success_message = "All GPS coordinates are within Portland, Oregon area (lat: 45-46°N, lon: 122-123°W)."
+    failure_message = "coordinates outside Portland area"
+
+    MIN_LATITUDE = 45.0
+    MAX_LATITUDE = 46.0
+    MIN_LONGITUDE = -123.0
+    MAX_LONGITUDE = -122.0
+
+    def __init__(self):
+        super().__init__()
+        self.missing = 0
+
+    def check(self, record):
+        if 'GPS_LATITUDE' not in record or 'GPS_LONGITUDE' not in record:
+            self.missing += 1  # reported, but not a failure, as in verify_coordinates_within_portland
+            return
+        lat = record['GPS_LATITUDE']
+        lon = record['GPS_LONGITUDE']
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            try:
+                lat = float(lat)
+                lon = float(lon)
+            except (ValueError, TypeError):
+                self.violation(f"Non-numeric coordinates: lat={lat}, lon={lon}")
+                return
+        if np.isnan(lat) or np.isnan(lon):
+            # a null in a Parquet column arrives as NaN rather than None
+            self.violation(f"Non-numeric coordinates: lat={None if np.isnan(lat) else lat}, "
+                           f"lon={None if np.isnan(lon) else lon}")
+            return
+        if (lat < self.MIN_LATITUDE or lat > self.MAX_LATITUDE or
+            lon < self.MIN_LONGITUDE or lon > self.MAX_LONGITUDE):
+            self.violation(f"lat={lat}, lon={lon}")
+
+    def merge(self, other):
+        super().merge(other)
+        self.missing += other.missing
+
+    def report(self):
+        if self.missing:
+            print(f"Error: {self.missing} records missing GPS coordinates")
+        super().report()
+
+# Collects (seconds, meters) per vehicle and day in compact arrays and, in
+# finish(), sorts each day by time and compares every breadcrumb with the one
+# before it, like verify_meters_increase_with_time. Breadcrumbs do not arrive
+# in time order (most of DataTransport/bcsample.json does not), so nothing can
+# be decided record by record
+class MetersIncreaseAssertion(Assertion):
+    name = 'meters_increase_with_time'
+    version = 2
+    fields = ('VEHICLE_ID', 'OPD_DATE', 'timestamp', 'METERS')
+    success_message = "All vehicles' meters increase consistently with time."
+    failure_message = "instances where meters decreased as time increased"
+
+    def __init__(self):
+        super().__init__()
+        self.series = {}     # (vehicle, date) -> (seconds since the epoch, meters)
+        self.opd_dates = {}  # OPD_DATE text -> whether it parses
+        self.dropped = 0     # records skipped as in meters_arrays
+
+    def check(self, record):
+        try:
+            vehicle = record['VEHICLE_ID']
+            opd_date = record['OPD_DATE']
+            timestamp = parse_timestamp(record['timestamp'])
+            meters = float(record['METERS'])
+            if np.isnan(float(vehicle)) or np.isnan(meters):
+                raise ValueError("missing value")
+            if opd_date not in self.opd_dates:
+                self.opd_dates[opd_date] = parse_opd_date(opd_date) is not None
+        except (KeyError, ValueError, TypeError, AttributeError):
+            self.dropped += 1
+            return
+        if not self.opd_dates[opd_date]:
+            self.dropped += 1
+            return
+
+        key = (vehicle, opd_date)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = (array('q'), array('d'))
+        series[0].append(int((timestamp - EPOCH).total_seconds()))
+        series[1].append(meters)
+
+    def finish(self):
+        if self.dropped and not self.series:
+            self.fatal = "Error: No records could be checked for increasing meters"
+            return
+        for key, (seconds, meters) in self.series.items():
+            # stable, so breadcrumbs with the same time keep their file order
+            order = sorted(range(len(seconds)), key=seconds.__getitem__)
+            for prev, curr in zip(order, order[1:]):
+                if seconds[curr] > seconds[prev] and meters[curr] < meters[prev]:
+                    self.violation(meters_anomaly(key[0], key[1], seconds[prev], meters[prev],
+                                                  seconds[curr], meters[curr]))
+        self.series = {}
+
+    def merge(self, other):
+        super().merge(other)
+        self.dropped += other.dropped
+
+    def report(self):
+        if self.dropped:
+            print(f"Skipped {self.dropped} records with missing or unparsable fields")
+        super().report()
+
+ASSERTIONS = [
+    VehicleIdAssertion,
+    TimestampFormatAssertion,
+    PortlandCoordinatesAssertion,
+    MetersIncreaseAssertion,
+]
+
+##################################
+# Vectorized NumPy backend
+#
+# Each rule below takes a batch's columns and returns the indices of the
+# violating rows, evaluating the rule as one mask over the whole column.
+# The per-record classes above stay as the reference implementation.
+
+# character positions of the separators in the canonical DD:MM:YYYY:HH:MM:SS layout
+TIMESTAMP_COLONS = [2, 5, 10, 13, 16]
+TIMESTAMP_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18]
+
+# missing or non-numeric values come back as NaN
+def numeric_column(frame, name):
+    if name not in frame:
+        return np.full(len(frame), np.nan)
+    column = frame[name]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # e.g. VEHICLE_ID read back from a Parquet partition directory
+        column = column.astype(column.cat.categories.dtype) if column.notna().all() else column.astype(object)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64)
+
+def vehicle_id_violations(frame):
+    vehicle_id = numeric_column(frame, 'VEHICLE_ID')
+    return np.flatnonzero(np.isnan(vehicle_id) | (vehicle_id < 2901) | (vehicle_id > 99222))
+
+def coordinate_violations(frame):
+    lat = numeric_column(frame, 'GPS_LATITUDE')
+    lon = numeric_column(frame, 'GPS_LONGITUDE')
+    outside = ((lat < PortlandCoordinatesAssertion.MIN_LATITUDE) | (lat > PortlandCoordinatesAssertion.MAX_LATITUDE) |
+               (lon < PortlandCoordinatesAssertion.MIN_LONGITUDE) | (lon > PortlandCoordinatesAssertion.MAX_LONGITUDE))
+    return np.flatnonzero(outside | np.isnan(lat) | np.isnan(lon))
+
+# Lay timestamp strings out as a matrix of character codes. Returns a mask of
+# the rows in the canonical zero-padded DD:MM:YYYY:HH:MM:SS layout and their
+# day, month, year, hour, minute and second as integer arrays (meaningless
+# for the other rows)
+def timestamp_fields(values):
+    chars = values.astype('U20').view(np.uint32).reshape(len(values), 20)
+    digits = chars[:, TIMESTAMP_DIGITS] - ord('0')
+    canonical = ((chars[:, 18] != 0) & (chars[:, 19] == 0) &
+                 (chars[:, TIMESTAMP_COLONS] == ord(':')).all(axis=1) &
+                 (digits <= 9).all(axis=1))
+    if pd.api.types.infer_dtype(values, skipna=False) != 'string':
+        # only real strings count, not values whose str() happens to look right
+        canonical &= np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+
+    digits = np.where(canonical[:, None], digits, 0).astype(np.int64)
+    pairs = digits[:, 0::2] * 10 + digits[:, 1::2]
+    day, month, century, year, hour, minute, second = pairs.T
+    return canonical, (day, month, century * 100 + year, hour, minute, second)
+
+# DD:MM:YYYY:HH:MM:SS with all six parts integers and a valid time of day.
+# Rows in the canonical layout are checked with array operations and the few
+# that are not (unpadded, non-string, ...) fall back to timestamp_problem()
+def timestamp_violations(frame):
+    if 'TIMESTAMP' in frame:
+        return np.flatnonzero(frame['TIMESTAMP'].isna().to_numpy())
+
+    values = frame['timestamp'].to_numpy()
+    canonical, (day, month, year, hour, minute, second) = timestamp_fields(values)
+    bad = canonical & ((hour > 23) | (minute > 59) | (second > 59))
+
+    others = np.flatnonzero(~canonical)
+    bad[others] = [timestamp_problem(values[i]) is not None for i in others]
+    return np.flatnonzero(bad)
+
+class VectorizedVehicleIdAssertion(VehicleIdAssertion):
+    def check_batch(self, batch):
+        frame = batch.frame
+        if 'VEHICLE_ID' not in frame or frame['VEHICLE_ID'].isna().any():
+            if self.fatal is None:
+                self.fatal = "Error: Record missing VEHICLE_ID field"
+            return
+        bad = vehicle_id_violations(frame)
+        self.violations += len(bad)
+        room = MAX_SAMPLES - len(self.samples)
+        self.samples.extend(frame['VEHICLE_ID'].to_numpy()[bad[:room]].tolist())
+
+class VectorizedTimestampFormatAssertion(TimestampFormatAssertion):
+    def check_batch(self, batch):
+        frame = batch.frame
+        if 'TIMESTAMP' in frame:
+            bad = timestamp_violations(frame)
+            self.violations += len(bad)
+            return
+        if 'timestamp' not in frame or frame['timestamp'].isna().any():
+            if self.fatal is None:
+                self.fatal = "Error: Record missing timestamp field"
+            return
+        bad = timestamp_violations(frame)
+        self.violations += len(bad)
+        room = MAX_SAMPLES - len(self.samples)
+        values = frame['timestamp'].to_numpy()
+        self.samples.extend(timestamp_problem(values[i]) for i in bad[:room])
+
+class VectorizedPortlandCoordinatesAssertion(PortlandCoordinatesAssertion):
+    def check_batch(self, batch):
+        frame = batch.frame
+        missing = batch.missing('GPS_LATITUDE', 'GPS_LONGITUDE')
+        self.missing += int(missing.sum())
+        if missing.all():
+            return
+        bad = coordinate_violations(frame)
+        bad = bad[~missing[bad]]
+        self.violations += len(bad)
+        room = MAX_SAMPLES - len(self.samples)
+        lat = numeric_column(frame, 'GPS_LATITUDE')
+        lon = numeric_column(frame, 'GPS_LONGITUDE')
+        raw_lat = frame['GPS_LATITUDE'].astype(object).where(frame['GPS_LATITUDE'].notna(), None).to_numpy()
+        raw_lon = frame['GPS_LONGITUDE'].astype(object).where(frame['GPS_LONGITUDE'].notna(), None).to_numpy()
+        for i in bad[:room]:
+            if np.isnan(lat[i]) or np.isnan(lon[i]):
+                self.samples.append(f"Non-numeric coordinates: lat={raw_lat[i]}, lon={raw_lon[i]}")
+            else:
+                self.samples.append(f"lat={lat[i]}, lon={lon[i]}")
+
+# Collects compact integer keys from every batch and checks them all at once in
+# finish(), like verify_meters_increase_with_time; it sorts, so it does not
+# depend on the order breadcrumbs arrive in. Set workers to split vehicles
+# across a process pool
+class VectorizedMetersIncreaseAssertion(MetersIncreaseAssertion):
+    workers = 1
+
+    def __init__(self):
+        super().__init__()
+        self.columns = []
+        self.dates = {}
+
+    def check_batch(self, batch):
+        *columns, dates, dropped = meters_arrays(batch.frame)
+        self.columns.append(columns)
+        self.dates.update(dates)
+        self.dropped += dropped
+
+    def finish(self):
+        if not self.columns:
+            return
+        vehicle, date, seconds, meters = (np.concatenate(column) for column in zip(*self.columns))
+        self.columns = []
+        if self.dropped and not len(vehicle):
+            self.fatal = "Error: No records could be checked for increasing meters"
+            return
+        if self.workers > 1:
+            prev, curr = meters_violations_parallel(vehicle, date, seconds, meters, self.workers)
+        else:
+            prev, curr = meters_violations(vehicle, date, seconds, meters)
+        self.violations += len(curr)
+        for p, c in zip(prev[:MAX_SAMPLES], curr[:MAX_SAMPLES]):
+            self.samples.append(meters_anomaly(vehicle[c], self.dates[date[c]], seconds[p], meters[p],
+                                               seconds[c], meters[c]))
+
+BACKENDS = {
+    'python': ASSERTIONS,
+    'numpy': [
+        VectorizedVehicleIdAssertion,
+        VectorizedTimestampFormatAssertion,
+        VectorizedPortlandCoordinatesAssertion,
+        VectorizedMetersIncreaseAssertion,
+    ],
+}
+
+# Parse the file once and run every assertion over each batch of records.
+# Returns {assertion name: passed}
+def run_assertions(path, assertions=ASSERTIONS, cache=None):
+    start = time.perf_counter()
+    try:
+        checks, records = check_file(path, assertions, cache)
+    except FileNotFoundError:
+        print(f"Error: File not found: {path}")
+        return {assertion.name: False for assertion in assertions}
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON format in file {path}: {e}")
+        return {assertion.name: False for assertion in assertions}
+    except Exception as e:
+        print(f"Error: An unexpected error occurred: {e}")
+        return {assertion.name: False for assertion in assertions}
+    elapsed = time.perf_counter() - start
+
+    for check in checks:
+        check.report()
+    checked = sum(check.seconds for check in checks)
+    print(f"Checked {records} records in {elapsed:.3f} seconds "
+          f"({elapsed - checked:.3f} parsing, {checked:.3f} in assertions)")
+    if cache is not None:
+        cache.evict()
+    return {check.name: check.passed() for check in checks}
+
+# Run every assertion over one file without reporting. Returns (checks, records).
+# With a cache, assertions already run on identical file contents are not re-run,
+# and the file is not parsed at all if none are left
+def check_file(path, assertions=ASSERTIONS, cache=None):
+    if cache is not None:
+        digest, hits, records = cache.lookup(path, assertions)
+        todo = [assertion for assertion, hit in zip(assertions, hits) if hit is None]
+        if todo:
+            fresh, records = check_file(path, todo)
+            cache.store(digest, fresh, records)
+            fresh = iter(fresh)
+            hits = [hit if hit is not None else next(fresh) for hit in hits]
+        return hits, records
+
+    checks = [assertion() for assertion in assertions]
+    records = 0
+    for batch in iter_batches(path, assertion_fields(assertions)):
+        run_batch(checks, batch)
+        records += len(batch)
+    for check in checks:
+        finish_check(check)
+    return checks, records
+
+def run_batch(checks, batch):
+    for check in checks:
+        start = time.perf_counter()
+        check.check_batch(batch)
+        check.seconds += time.perf_counter() - start
+
+def finish_check(check):
+    start = time.perf_counter()
+    check.finish()
+    check.seconds += time.perf_counter() - start
+
+##################################
+# Result cache
+#
+# Finished assertion results are kept in a SQLite file keyed by (file content
+# hash, assertion class, assertion version), so re-validating unchanged files
+# or re-running after adding a rule only evaluates what is new. Content hashes
+# are remembered per (path, size, mtime) so unchanged files are not re-read
+# either. The cache is bounded in size and evicts least recently used results.
+
+CACHE_PATH = '.assertion_cache.sqlite'
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+HASH_READ_SIZE = 1 << 20
+
+# The python and numpy classes of an assertion share its name but need not
+# give the same result, so results are cached per class
+def cache_name(assertion):
+    return f"{assertion.__qualname__}:{assertion.name}"
+
+class ResultCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # several worker processes may share the file; wait for their writes
+        self.conn = sqlite3.connect(path, timeout=60)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    file_hash   TEXT,
+                    name        TEXT,       -- cache_name() of the assertion class
+                    version     INTEGER,
+                    records     INTEGER,
+                    result      BLOB,
+                    size        INTEGER,
+                    last_used   REAL,
+                    PRIMARY KEY (file_hash, name, version)
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path        TEXT PRIMARY KEY,
+                    size        INTEGER,
+                    mtime_ns    INTEGER,
+                    file_hash   TEXT
+                )""")
+
+    # blake2b of the file contents; a Parquet dataset directory hashes every
+    # file in it along with its relative path
+    def file_hash(self, path):
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        stats = [os.stat(file) for file in files]
+        size = sum(stat.st_size for stat in stats)
+        mtime_ns = max((stat.st_mtime_ns for stat in stats), default=0)
+        key = os.path.abspath(path)
+
+        row = self.conn.execute("SELECT size, mtime_ns, file_hash FROM files WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime_ns:
+            return row[2]
+
+        digest = hashlib.blake2b()
+        for file in files:
+            if file != path:
+                digest.update(os.path.relpath(file, path).encode('utf-8'))
+            with open(file, 'rb') as f:
+                while chunk := f.read(HASH_READ_SIZE):
+                    digest.update(chunk)
+        file_hash = digest.hexdigest()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (key, size, mtime_ns, file_hash))
+        return file_hash
+
+    # Returns (file hash, cached check or None for each assertion, record count or None)
+    def lookup(self, path, assertions):
+        file_hash = self.file_hash(path)
+        hits = []
+        records = None
+        now = time.time()
+        with self.conn:
+            for assertion in assertions:
+                row = self.conn.execute(
+                    "SELECT records, result FROM results WHERE file_hash = ? AND name = ? AND version = ?",
+                    (file_hash, cache_name(assertion), assertion.version)).fetchone()
+                if row is None:
+                    hits.append(None)
+                    continue
+                self.conn.execute("UPDATE results SET last_used = ? WHERE file_hash = ? AND name = ? AND version = ?",
+                                  (now, file_hash, cache_name(assertion), assertion.version))
+                records, result = row
+                check = pickle.loads(result)
+                check.seconds = 0.0
+                hits.append(check)
+        return file_hash, hits, records
+
+    def store(self, file_hash, checks, records):
+        now = time.time()
+        with self.conn:
+            for check in checks:
+                result = pickle.dumps(check, protocol=pickle.HIGHEST_PROTOCOL)
+                self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  (file_hash, cache_name(type(check)), check.version, records, result, len(result), now))
+
+    # Drop least recently used results until the cache fits in max_bytes
+    def evict(self):
+        with self.conn:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.conn.execute("SELECT rowid, size FROM results ORDER BY last_used").fetchall()
+            doomed = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((rowid,))
+                total -= size
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+            self.conn.execute("DELETE FROM files WHERE file_hash NOT IN (SELECT file_hash FROM results)")
+
+    def close(self):
+        self.conn.close()
+
+##################################
+# Multi-file runner
+#
+# BusDataScript/testing.py writes one BUS{id}_{date}.json file per vehicle
+# into a dated folder. validate_files() checks a whole folder (or glob) on a
+# process pool, one file per task, and merges the results into one report.
+
+# A directory holding .parquet files or key=value partition directories, as
+# DataTransformation/data_transport.py writes them
+def is_parquet_dataset(path):
+    if not os.path.isdir(path):
+        return False
+    return any(entry.name.endswith('.parquet') or (entry.is_dir() and '=' in entry.name)
+               for entry in os.scandir(path))
+
+# A directory of JSON files or a glob pattern, as opposed to a single file or
+# a Parquet dataset directory. Any other directory counts as one, so an empty
+# folder is reported as having no files rather than read as an empty dataset
+def is_multi_file(path):
+    if any(c in path for c in '*?['):
+        return True
+    return os.path.isdir(path) and not is_parquet_dataset(path)
+
+def expand_paths(path):
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.json')))
+    return sorted(glob.glob(path))
+
+# Runs in a worker process; errors are returned so one bad file does not stop the run
+def check_file_worker(path, assertions, cache_path=None):
+    cache = ResultCache(cache_path) if cache_path is not None else None
+    try:
+        checks, records = check_file(path, assertions, cache)
+        return path, checks, records, None
+    except FileNotFoundError:
+        return path, None, 0, f"Error: File not found: {path}"
+    except json.JSONDecodeError as e:
+        return path, None, 0, f"Error: Invalid JSON format in file {path}: {e}"
+    except Exception as e:
+        return path, None, 0, f"Error: An unexpected error occurred in file {path}: {e}"
+    finally:
+        if cache is not None:
+            cache.close()
+
+# Check every file on a pool of processes (one per core by default) and print
+# one merged report. Returns {assertion name: passed}; unreadable files fail all.
+# With a cache, workers share its file and only evaluate what is not in it yet
+def validate_files(paths, assertions=ASSERTIONS, processes=None, cache=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not paths:
+        print("Error: No files to check")
+        return {assertion.name: False for assertion in assertions}
+    processes = processes or os.cpu_count()
+    merged = [assertion() for assertion in assertions]
+    records = 0
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunksize = max(1, len(paths) // (processes * 4))
+        cache_path = cache.path if cache is not None else None
+        results = pool.map(check_file_worker, paths, [assertions] * len(paths), [cache_path] * len(paths),
+                           chunksize=chunksize)
+        # merged in path order, so the samples are the same whatever the process count
+        for path, checks, count, error in results:
+            if error is not None:
+                print(error)
+                failed.append(path)
+                continue
+            for total, check in zip(merged, checks):
+                total.merge(check)
+            records += count
+    elapsed = time.perf_counter() - start
+
+    for check in merged:
+        check.report()
+    checked = len(paths) - len(failed)
+    print(f"Checked {checked} files, {records} records in {elapsed:.3f} seconds with "
+          f"{processes} processes ({checked / elapsed:.1f} files/sec, {records / elapsed:.0f} records/sec)")
+    if failed:
+        print(f"Error: {len(failed)} files could not be read")
+    if cache is not None:
+        cache.evict()
+    return {check.name: check.passed() and not failed for check in merged}
+
+# Run both backends on the same file and compare their assertion times and verdicts
+def benchmark_backends(path):
+    results = {}
+    for backend, assertions in BACKENDS.items():
+        print(f"\n--- {backend} backend ---")
+        checks = [assertion() for assertion in assertions]
+        batches = list(iter_batches(path, assertion_fields(assertions)))
+        for batch in batches:
+            batch.records
+            batch.frame
+        for batch in batches:
+            run_batch(checks, batch)
+        for check in checks:
+            finish_check(check)
+            check.report()
+        results[backend] = checks
+
+    print("\nAssertion                    |   python s |    numpy s | speedup | same verdict")
+    print("-" * 80)
+    for py, vec in zip(results['python'], results['numpy']):
+        speedup = py.seconds / vec.seconds if vec.seconds else float('inf')
+        same = py.passed() == vec.passed() and py.violations == vec.violations
+        print(f"{py.name:28} | {py.seconds:10.4f} | {vec.seconds:10.4f} | {speedup:6.1f}x | {same}")
+    return results
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        json_file = sys.argv[1]
-        verify_vehicle_ids(json_file)
-        verify_timestamp_format(json_file)
-        verify_coordinates_within_portland(json_file)
-        verify_meters_increase_with_time(json_file)
+    parser = argparse.ArgumentParser(description="Validate breadcrumb JSON files or a Parquet dataset")
+    parser.add_argument("path", help="a JSON/NDJSON file, a Parquet file or dataset, "
+                                     "or a directory or glob of JSON files")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="python")
+    parser.add_argument("--benchmark", action="store_true", help="compare the python and numpy backends")
+    parser.add_argument("--workers", type=int, default=1, help="processes for the numpy meters check")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="processes for a directory or glob of files (default: one per core)")
+    parser.add_argument("--cache", nargs="?", const=CACHE_PATH, default=None,
+                        help=f"reuse results for unchanged files from this cache (default {CACHE_PATH})")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_BYTES // (1024 * 1024),
+                        help="cache size limit in MB")
+    args = parser.parse_args()
+
+    VectorizedMetersIncreaseAssertion.workers = args.workers
+    cache = ResultCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+    if args.benchmark:
+        if is_multi_file(args.path):
+            parser.error("--benchmark takes a single file or Parquet dataset")
+        benchmark_backends(args.path)
+    elif is_multi_file(args.path):
+        paths = expand_paths(args.path)
+        if not paths:
+            parser.error(f"no files match {args.path}")
+        validate_files(paths, BACKENDS[args.backend], args.processes, cache)
     else:
-        print("Usage: python Chris_Assertions.py <path_to_json_file>")
\ No newline at end of file
+        run_assertions(args.path, BACKENDS[args.backend], cache)
\ No newline at end of file